@@ -2,9 +2,27 @@ from django.contrib import admin
 
 from .models import *
 
+# Enter results from the admin. The recompute runs in the background (see jobs.py).
+def team1_wins(modeladmin, request, queryset):
+    for game in queryset.order_by('-gid'):
+        game.set_winner(True)
+team1_wins.short_description = "Set winner: team 1"
+
+def team2_wins(modeladmin, request, queryset):
+    for game in queryset.order_by('-gid'):
+        game.set_winner(False)
+team2_wins.short_description = "Set winner: team 2"
+
+class GameAdmin(admin.ModelAdmin):
+    list_display = ['gid', 'team1', 'team2', 'winner']
+    actions = [team1_wins, team2_wins]
+
 admin.site.register(Owner)
 admin.site.register(Bracket)
 admin.site.register(Slot)
-admin.site.register(Game)
+admin.site.register(Game, GameAdmin)
 admin.site.register(Team)
 admin.site.register(TeamDepth)
+admin.site.register(Scenario)
+admin.site.register(RecomputeJob)
+admin.site.register(TournamentState)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class BracketeeringConfig(AppConfig):
     name = 'bracketeering'
+
+    def ready(self):
+        # connects the signals that drop the cached leaderboard
+        import bracketeering.leaderboard
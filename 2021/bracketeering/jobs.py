@@ -0,0 +1,106 @@
+import threading
+import traceback
+from datetime import timedelta
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from bracketeering.models import RecomputeJob
+from bracketeering.recompute import recompute_all
+
+# Recomputes run outside the request that enters a result. Game.set_winner
+# only adds a RecomputeJob row, and a worker (a thread in the same process, or
+# `python manage.py recompute_worker`) picks it up. Every job that is pending
+# when the worker looks is handled by one recompute_all() pass, so a burst of
+# results costs one recompute.
+
+# Seconds between checks for jobs enqueued by other processes
+kPollInterval = 5
+
+# Give up retrying after this many failed jobs in a row
+kMaxAttempts = 3
+
+# Seconds to wait before retrying a failed recompute, so whatever made it fail
+# (e.g. a lock held by another request) has time to clear
+kRetryDelay = 30
+
+# Add a job, unless one is already waiting (it will see this result too). A
+# waiting retry is run now instead, so the new result doesn't wait for it.
+def enqueue_recompute(start_thread=True):
+    job = RecomputeJob.objects.filter(status=RecomputeJob.PENDING).first()
+    if job is None:
+        job = RecomputeJob.objects.create()
+    elif job.not_before is not None:
+        RecomputeJob.objects.filter(id=job.id).update(not_before=None)
+        job.not_before = None
+    if start_thread:
+        start_worker_thread()
+    worker_wakeup.set()
+    return job
+
+# Add a job that waits `delay` seconds. The worker finds it on a later poll.
+def enqueue_retry(delay=kRetryDelay):
+    job = RecomputeJob.objects.filter(status=RecomputeJob.PENDING).first()
+    if job is None:
+        job = RecomputeJob.objects.create(not_before=timezone.now() + timedelta(seconds=delay))
+    return job
+
+# Try a failed recompute again, `delay` seconds from now. But not forever.
+def retry_failed(delay=kRetryDelay):
+    recent = list(RecomputeJob.objects.exclude(status=RecomputeJob.PENDING).order_by('-id').values_list('status', flat=True)[:kMaxAttempts])
+    if len(recent) < kMaxAttempts or RecomputeJob.DONE in recent:
+        enqueue_retry(delay)
+
+# Claim every pending job that is due and run them as one recompute.
+# Returns the number of jobs handled.
+def run_pending_jobs():
+    # A worker that died (see kRecomputeTimeout) never finishes its jobs, so
+    # they count as failed, and are retried right away.
+    if RecomputeJob.stale().update(status=RecomputeJob.FAILED, finished=timezone.now(), error="The worker stopped before finishing"):
+        retry_failed(0)
+
+    due = Q(not_before__isnull=True) | Q(not_before__lte=timezone.now())
+    ids = list(RecomputeJob.objects.filter(due, status=RecomputeJob.PENDING).values_list('id', flat=True))
+    if not ids:
+        return 0
+    # another worker may have claimed them first
+    claimed = RecomputeJob.objects.filter(id__in=ids, status=RecomputeJob.PENDING).update(status=RecomputeJob.RUNNING, started=timezone.now())
+    if not claimed:
+        return 0
+    jobs = RecomputeJob.objects.filter(id__in=ids, status=RecomputeJob.RUNNING)
+    try:
+        recompute_all()
+    except Exception:
+        jobs.update(status=RecomputeJob.FAILED, finished=timezone.now(), error=traceback.format_exc())
+        # A result entered during the recompute can make it fail (e.g. a lock
+        # timeout), so try again a little later.
+        retry_failed()
+    else:
+        jobs.update(status=RecomputeJob.DONE, finished=timezone.now())
+    return claimed
+
+def run_worker(stop=None):
+    while stop is None or not stop.is_set():
+        worker_wakeup.wait(kPollInterval)
+        worker_wakeup.clear()
+        close_old_connections()
+        try:
+            run_pending_jobs()
+        except Exception:
+            traceback.print_exc()
+
+worker_wakeup = threading.Event()
+worker_thread = [None]
+worker_lock = threading.Lock()
+
+# A job left by a process that has since stopped (still pending, or running
+# with no worker) would otherwise wait for the next result entered in this one.
+# So the pages that say whether a recompute is on its way start a worker here.
+def check_jobs():
+    if RecomputeJob.objects.filter(status__in=[RecomputeJob.PENDING, RecomputeJob.RUNNING]).exists():
+        start_worker_thread()
+
+def start_worker_thread():
+    with worker_lock:
+        if worker_thread[0] is None or not worker_thread[0].is_alive():
+            worker_thread[0] = threading.Thread(target=run_worker, name='recompute-worker', daemon=True)
+            worker_thread[0].start()
@@ -0,0 +1,72 @@
+import hashlib
+import json
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+from bracketeering.models import Owner, Bracket, Slot, RecomputeJob
+
+# The leaderboard on the main page only changes when a game result is entered,
+# but it is reloaded constantly during the games. So it is built once, stored
+# in the cache, and rebuilt after Game.set_winner commits. Any other change to
+# an owner, bracket or slot (the admin, the initdb scripts) drops it instead,
+# and the next request rebuilds it.
+kLeaderboardKey = 'leaderboard'
+
+def build_leaderboard():
+    brackets = []
+    for bracket in Bracket.objects.select_related('owner'):
+        brackets.append({
+            'bid': bracket.bid,
+            'owner': bracket.owner.name,
+            'points': bracket.get_points(),
+            'potential': bracket.get_potential(),
+        })
+    owners = []
+    for owner in Owner.objects.all():
+        owners.append({
+            'name': owner.name,
+            'sum_of_2': owner.sum_of_2,
+            'best_bracket': owner.best_bracket,
+            'max_elite_eight': owner.max_elite_eight,
+            'streak': owner.get_streak_winner_str(),
+            'payout': owner.payout,
+        })
+    rows = json.dumps([brackets, owners])
+    return {
+        'brackets': brackets,
+        'owners': owners,
+        'etag': hashlib.md5(rows.encode()).hexdigest(),
+        'updated': timezone.now(),
+    }
+
+def rebuild_leaderboard():
+    leaderboard = build_leaderboard()
+    cache.set(kLeaderboardKey, leaderboard, None)
+    return leaderboard
+
+def invalidate_leaderboard(sender, **kwargs):
+    # after the commit, or a request in between could cache the old rows again
+    transaction.on_commit(lambda: cache.delete(kLeaderboardKey))
+
+# (bulk_update does not send these; the recomputes rebuild the leaderboard themselves)
+for model in [Owner, Bracket, Slot]:
+    post_save.connect(invalidate_leaderboard, sender=model, dispatch_uid='leaderboard_save_%s' % model.__name__)
+    post_delete.connect(invalidate_leaderboard, sender=model, dispatch_uid='leaderboard_delete_%s' % model.__name__)
+
+def get_leaderboard():
+    leaderboard = cache.get(kLeaderboardKey)
+    if leaderboard is None:
+        leaderboard = rebuild_leaderboard()
+    return leaderboard
+
+# For django.views.decorators.http.condition. The page also says whether a
+# recompute is on its way, so that is part of the ETag.
+def leaderboard_etag(request, *args, **kwargs):
+    etag = get_leaderboard()['etag']
+    if RecomputeJob.is_updating():
+        etag += '-updating'
+    return etag
+
+def leaderboard_last_modified(request, *args, **kwargs):
+    return get_leaderboard()['updated']
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from bracketeering.jobs import run_pending_jobs, run_worker
+
+class Command(BaseCommand):
+    help = "Run the recompute jobs queued by Game.set_winner."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="run the pending jobs and exit")
+
+    def handle(self, *args, **options):
+        if options['once']:
+            self.stdout.write("Ran %d job(s)" % run_pending_jobs())
+        else:
+            run_worker()
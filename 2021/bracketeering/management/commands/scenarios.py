@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from bracketeering.scenarios import get_scenario_index
+
+class Command(BaseCommand):
+    help = "Who wins the sum of 2 and best bracket payouts, given some winners. (Uses the stored scenarios.)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('winners', nargs='*', help="given winners, as gid=team (e.g. 5=Michigan)")
+        parser.add_argument('--beats', nargs=2, action='append', default=[], metavar=('WINNER', 'LOSER'),
+                help="the winner beats the loser, in whichever game they would meet")
+
+    def handle(self, *args, **options):
+        index = get_scenario_index()
+        if not index.probabilities:
+            raise CommandError("No scenarios. Run initdb/run_scenarios.py first.")
+
+        givens = {}
+        for given in options['winners']:
+            gid, _, name = given.partition('=')
+            givens[int(gid)] = name.replace('-', ' ')
+        for winner, loser in options['beats']:
+            winner = winner.replace('-', ' ')
+            gid = index.get_meeting_game(winner, loser.replace('-', ' '))
+            if gid is None:
+                raise CommandError("%s and %s do not meet in any scenario" % (winner, loser))
+            givens[gid] = winner
+
+        for gid in sorted(givens, reverse=True):
+            self.stdout.write("Game %d: %s" % (gid, givens[gid]))
+        for name, sum2, best in index.get_odds(givens):
+            self.stdout.write("%s - Sum2: %.2f - Best: %.2f" % (name, sum2, best))
@@ -0,0 +1,28 @@
+# Generated by Django 3.1.7 on 2026-10-18 16:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bracketeering', '0008_teamdepth'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Scenario',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sid', models.IntegerField(unique=True)),
+                ('winners', models.TextField()),
+                ('probability', models.FloatField()),
+                ('sum_of_2_points', models.IntegerField()),
+                ('sum_of_2_winner', models.CharField(max_length=200)),
+                ('sum_of_2_bids', models.CharField(max_length=200)),
+                ('best_points', models.IntegerField()),
+                ('best_winner', models.CharField(max_length=200)),
+                ('best_bid', models.CharField(max_length=200)),
+            ],
+        ),
+    ]
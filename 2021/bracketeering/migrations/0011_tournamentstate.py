@@ -0,0 +1,22 @@
+# Generated by Django 3.1.7 on 2026-10-18 16:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bracketeering', '0010_recomputejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TournamentState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.IntegerField(default=0)),
+                ('data', models.TextField(default='{}')),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.7 on 2026-10-18 16:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bracketeering', '0011_tournamentstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recomputejob',
+            name='not_before',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+# The one TournamentState row (see state.py), so rebuild_state always has a
+# row to lock and the readers never have to create it.
+def create_state(apps, schema_editor):
+    TournamentState = apps.get_model('bracketeering', 'TournamentState')
+    TournamentState.objects.get_or_create(id=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bracketeering', '0012_recomputejob_not_before'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_state, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,43 @@
-from django.db import models
+from collections import namedtuple
+from datetime import timedelta
+from django.db import models, transaction
+from django.utils import timezone
+
+# Everything about a game that only depends on its gid, computed once.
+#
+# gid 1 is the championship, and the games feeding game g are 2g and 2g+1. The
+# First Four games are 65, 73, 81 and 89. (Their winners are team2 of games
+# 32, 36, 40 and 44.)
+kFirstFourGids = (65, 73, 81, 89)
+kGids = tuple(range(1, 64)) + kFirstFourGids
+kRoundStrs = ("First Four", "1st Round", "2nd Round", "Sweet Sixteen", "Elite Eight", "Final Four", "Championship")
+kRegionStrs = ("No Region", "West", "East", "South", "Midwest")
+kPointsPerRound = (1, 1, 2, 3, 5, 8, 13)
+
+GameInfo = namedtuple('GameInfo', ['gid', 'round', 'round_str', 'region', 'region_str', 'points', 'bonus_key', 'parent', 'children'])
+
+def game_info(gid):
+    rd = 7 - gid.bit_length()
+    region = 0
+    if rd <= 4:
+        region = gid // pow(2, 4 - rd) - 3
+    # 5 point bonuses for perfect region in round of 32, sweet 16, elite 8
+    # (round, region), no bonuses for First Four or Championship rounds
+    bonus_key = None
+    if rd != 0 and rd != 6:
+        bonus_key = (rd, region if rd < 4 else 0)
+    parent = gid // 2 if gid > 1 else None
+    children = tuple(child for child in (2 * gid, 2 * gid + 1) if child in kGids)
+    return GameInfo(gid, rd, kRoundStrs[rd], region, kRegionStrs[region], kPointsPerRound[rd], bonus_key, parent, children)
+
+# kGameInfo[gid] (None for gids that aren't games)
+kGameInfo = tuple(game_info(gid) if gid in kGids else None for gid in range(128))
+
+# The gids in each bonus group
+kBonusGids = {}
+for info in kGameInfo:
+    if info and info.bonus_key:
+        kBonusGids[info.bonus_key] = kBonusGids.get(info.bonus_key, ()) + (info.gid,)
 
 class Owner(models.Model):
     name = models.CharField(max_length=100,unique=True)
@@ -31,22 +70,28 @@ class Owner(models.Model):
     #        for calculating the given payouts... Still it might help readability
     #        to break this out into smaller methods. Also, if I were to test
     #        this code (I won't), I would want it broken up 
+    #
+    # owners and brackets can be passed in, if they are already loaded
     @staticmethod
-    def update_payouts():
+    def update_payouts(owners=None, brackets=None):
         # assumes everything is up to date
         buy_in = 20.
-        owners = Owner.objects.all()
-        owners_count = Owner.objects.count()
+        if owners is None:
+            owners = list(Owner.objects.all())
+        if brackets is None:
+            brackets = Bracket.objects.all()
+        owners_count = len(owners)
         if owners_count == 0:
             return
         payouts = [-buy_in for i in range(owners_count)]
 
         # NOTE : this is a small use case. Only 28 brackets. So I am just grabbing all of them
         elite_eight = [[] for i in range(owners_count)]
+        owner_i = {owner.id: i for i, owner in enumerate(owners)}
+        for bracket in brackets:
+            elite_eight[owner_i[bracket.owner_id]].append(bracket.elite_eight)
         for i, owner in enumerate(owners):
-            brackets = owner.get_brackets().order_by('elite_eight')
-            for bracket in brackets:
-                elite_eight[i].append(bracket.elite_eight)
+            elite_eight[i].sort()
             # Store max elite eight for this owner for display purposes
             owner.max_elite_eight = elite_eight[i][-1]
         brackets_per_owner = len(elite_eight[0])
@@ -125,17 +170,20 @@ class Owner(models.Model):
         # update payouts for owner objects
         for i, owner in enumerate(owners):
             owner.payout = payouts[i]
-            owner.save()
+        Owner.objects.bulk_update(owners, ['sum_of_2', 'best_bracket', 'max_elite_eight', 'payout'])
 
     def update(self):
-        brackets = Bracket.objects.filter(owner=self)
+        self.score(Bracket.objects.filter(owner=self))
+        self.save()
+
+    # Set best_bracket and sum_of_2 from this owner's brackets
+    def score(self, brackets):
         scores = []
         for bracket in brackets:
             scores.append(bracket.get_points())
         scores.sort()
         self.best_bracket = scores[-1]
         self.sum_of_2 = scores[-1] + scores[-2]
-        self.save()
 
 class Bracket(models.Model):
     bid = models.IntegerField(unique=True)
@@ -164,31 +212,29 @@ class Bracket(models.Model):
         return self.potential_norm + self.potential_bonus
 
     def update(self):
+        self.score(Slot.objects.filter(bracket=self).select_related('game'))
+        self.save()
+        print("Updated bracket: " + str(self.bid))
+
+    # Set the totals from this bracket's slots. (Their games must be loaded.)
+    def score(self, slots):
         points = [[0,0],[0,0]] # [[norm, bonus], [pot_norm, pot_bonus]]
         h = {} # [bonus, pot_bonus]
         elite_eight = [0,0] # [count, pot_count]
-        slots = Slot.objects.filter(bracket=self)
         for slot in slots:
             vals = [slot.points, slot.potential]
 
             # 5 point bonuses for perfect region in round of 32, sweet 16, elite 8
-            rd = slot.game.get_round()
-            # no bonuses for First Four or Championship rounds
-            key = None
-            if rd != 0 and rd != 6:
-                rgn = 0
-                if rd < 4:
-                    rgn = slot.game.get_region()
-                key = (rd, rgn)
-                if key not in h:
-                    h[key] = [5, 5]
+            key = slot.game.get_bonus_key()
+            if key and key not in h:
+                h[key] = [5, 5]
             
             for i in range(2): # 0: points, 1: potential
                 points[i][0] += vals[i]
                 if key:
                     if vals[i] == 0:
                         h[key][i] = 0
-                    elif rd == 3: # store Elite Eight count (needed for a payout)
+                    elif key[0] == 3: # store Elite Eight count (needed for a payout)
                         elite_eight[i] += 1
 
         # sum the bonuses
@@ -202,8 +248,59 @@ class Bracket(models.Model):
         self.potential_bonus = points[1][1]
         self.elite_eight = elite_eight[0]
         self.elite_eight_pot = elite_eight[1]
-        self.save()
-        print("Updated bracket: " + str(self.bid))
+
+    # Apply a batch of slot changes to the bracket totals, without rescoring
+    # every slot. changes = [(slot, old_points, old_potential)], with the new
+    # values already on the slots. Only the bonus groups that contain a changed
+    # slot are looked at again.
+    # Returns the brackets whose points or elite eight count moved.
+    @staticmethod
+    def apply_slot_changes(changes):
+        if not changes:
+            return []
+        brackets = {}
+        old = {} # (bracket id, gid) -> [old points, old potential]
+        keys = set()
+        for slot, old_points, old_potential in changes:
+            brackets[slot.bracket_id] = None
+            old[(slot.bracket_id, slot.game.gid)] = [old_points, old_potential]
+            key = slot.game.get_bonus_key()
+            if key:
+                keys.add(key)
+        for bracket in Bracket.objects.filter(id__in=brackets.keys()):
+            brackets[bracket.id] = bracket
+
+        # before/after value of every slot in the touched bonus groups
+        groups = {} # (bracket id, key) -> [[points, potential] before, [points, potential] after]
+        gids = [gid for key in keys for gid in Game.get_bonus_gids(key)]
+        rows = Slot.objects.filter(bracket_id__in=brackets.keys(), game__gid__in=gids).values_list('bracket_id', 'game__gid', 'points', 'potential')
+        for bracket_id, gid, points, potential in rows:
+            group = groups.setdefault((bracket_id, Game.get_bonus_key_by_gid(gid)), [[5, 5], [5, 5]])
+            before = old.get((bracket_id, gid), [points, potential])
+            after = [points, potential]
+            for i in range(2): # 0: points, 1: potential
+                if before[i] == 0:
+                    group[0][i] = 0
+                if after[i] == 0:
+                    group[1][i] = 0
+
+        moved = {}
+        for slot, old_points, old_potential in changes:
+            bracket = brackets[slot.bracket_id]
+            bracket.points_norm += slot.points - old_points
+            bracket.potential_norm += slot.potential - old_potential
+            if kGameInfo[slot.game.gid].round == 3:
+                bracket.elite_eight += (slot.points > 0) - (old_points > 0)
+                bracket.elite_eight_pot += (slot.potential > 0) - (old_potential > 0)
+            if slot.points != old_points:
+                moved[bracket.id] = bracket
+        for (bracket_id, key), (before, after) in groups.items():
+            bracket = brackets[bracket_id]
+            bracket.points_bonus += after[0] - before[0]
+            bracket.potential_bonus += after[1] - before[1]
+
+        Bracket.objects.bulk_update(brackets.values(), ['points_norm', 'points_bonus', 'potential_norm', 'potential_bonus', 'elite_eight', 'elite_eight_pot'])
+        return list(moved.values())
 
 class Team(models.Model):
     name = models.CharField(max_length=100,unique=True)
@@ -260,37 +357,64 @@ class Game(models.Model):
             ret += "TBD"
         return ret
 
+    def get_info(self):
+        return kGameInfo[self.gid]
+
     def get_round(self):
-        return 7 - self.gid.bit_length()
+        return kGameInfo[self.gid].round
 
     def get_round_str(self):
-        rd = self.get_round()
-        return ["First Four", "1st Round", "2nd Round", "Sweet Sixteen", "Elite Eight", "Final Four", "Championship"][rd]
+        return kGameInfo[self.gid].round_str
 
     def get_region(self):
-        rd = self.get_round()
-        if rd > 4:
-            return 0
-        return self.gid // pow(2, 4 - rd) - 3
+        return kGameInfo[self.gid].region
 
     def get_region_str(self):
-        region = self.get_region()
-        return ["No Region", "West", "East", "South", "Midwest"][region]
+        return kGameInfo[self.gid].region_str
 
+    def get_points(self):
+        return kGameInfo[self.gid].points
+
+    # The games feeding this one, and the game the winner goes to. These only
+    # query for games that exist. (The gids are in kGameInfo.)
     def get_prev_game1(self):
-        return Game.get_by_gid(2 * self.gid)
+        if 2 * self.gid in kGameInfo[self.gid].children:
+            return Game.get_by_gid(2 * self.gid)
+        return None
 
     def get_prev_game2(self):
-        return Game.get_by_gid(2 * self.gid + 1)
-
-    def get_points(self):
-        rd = self.get_round()
-        return [1, 1, 2, 3, 5, 8, 13][rd]
+        if 2 * self.gid + 1 in kGameInfo[self.gid].children:
+            return Game.get_by_gid(2 * self.gid + 1)
+        return None
 
     def get_next_game(self):
-        return Game.get_by_gid(self.gid // 2)
+        if kGameInfo[self.gid].parent:
+            return Game.get_by_gid(kGameInfo[self.gid].parent)
+        return None
+
+    # 5 point bonuses for perfect region in round of 32, sweet 16, elite 8
+    # Returns the (round, region) bonus group of this game, or None.
+    def get_bonus_key(self):
+        return kGameInfo[self.gid].bonus_key
+
+    @staticmethod
+    def get_bonus_key_by_gid(gid):
+        return kGameInfo[gid].bonus_key
+
+    # The gids of the games in a bonus group
+    @staticmethod
+    def get_bonus_gids(key):
+        return kBonusGids[key]
+
+    # With background=True, only the game and teams are saved here. The slots,
+    # brackets, owners and payouts are left to a RecomputeJob (see jobs.py), so
+    # this returns right away, and several quick results share one recompute.
+    def set_winner(self, team1_wins, background=True):
+        # (imported here, since these modules import the models)
+        from bracketeering.leaderboard import rebuild_leaderboard
+        from bracketeering.jobs import enqueue_recompute
+        from bracketeering.state import rebuild_state
 
-    def set_winner(self, team1_wins):
         # only set winner if both teams are there
         if not self.team1 or not self.team2:
             return
@@ -301,41 +425,54 @@ class Game(models.Model):
             winner = self.team2
             loser = self.team1
 
-        # set this game's winner
-        self.winner = winner
-        self.save()
-
-        # propogate winner to next game
-        game = self.get_next_game()
-        if game:
-            if self.gid % 2 == 0:
-                game.team1 = winner
-            else:
-                game.team2 = winner
-            game.save()
-
-        # update teams' alive status
-        winner.alive = True
-        winner.save()
-        loser.alive = False
-        loser.save()
-
-        # update slots that deal with this game
-        # update slots that deal with losing team
-        slots = Slot.objects.filter(models.Q(game=self) | models.Q(winner=loser))
-        for slot in slots:
-            slot.update()
-
-        # update brackets
-        brackets = Bracket.objects.all()
-        for bracket in brackets:
-            bracket.update()
-
-        # update owners
-        owners = Owner.objects.all()
-        for owner in owners:
-            owner.update()
-        Owner.update_payouts()
+        with transaction.atomic():
+            # set this game's winner
+            self.winner = winner
+            self.save()
+
+            # propogate winner to next game
+            game = self.get_next_game()
+            if game:
+                if self.gid % 2 == 0:
+                    game.team1 = winner
+                else:
+                    game.team2 = winner
+                game.save()
+
+            # update teams' alive status
+            winner.alive = True
+            winner.save()
+            loser.alive = False
+            loser.save()
+
+            if background:
+                transaction.on_commit(enqueue_recompute)
+                return
+
+            # update slots that deal with this game
+            # update slots that deal with losing team
+            slots = Slot.objects.filter(models.Q(game=self) | models.Q(winner=loser)).select_related('game', 'winner')
+            changes = []
+            for slot in slots:
+                old_points = slot.points
+                old_potential = slot.potential
+                slot.score()
+                if slot.points != old_points or slot.potential != old_potential:
+                    changes.append((slot, old_points, old_potential))
+            Slot.objects.bulk_update([change[0] for change in changes], ['points', 'potential'])
+
+            # update only the brackets with changed slots
+            moved = Bracket.apply_slot_changes(changes)
+
+            # re-rank only the owners whose brackets moved
+            if moved:
+                for owner in Owner.objects.filter(bracket__in=moved).distinct():
+                    owner.update()
+                Owner.update_payouts()
+            rebuild_state()
+
+            # the cached leaderboard is rebuilt once everything is saved
+            transaction.on_commit(rebuild_leaderboard)
 
 
 class Slot(models.Model):
@@ -346,18 +483,21 @@ class Slot(models.Model):
     potential = models.IntegerField(default=0)
 
     def update(self):
+        self.score()
         self.save()
+
+    # Set points and potential from the game's winner and the picked team's alive status
+    def score(self):
         points = 0
         potential = 0
-        winner = self.game.winner
-        if winner and winner == self.winner:
+        winner_id = self.game.winner_id
+        if winner_id is not None and winner_id == self.winner_id:
             points = self.game.get_points()
             potential = points
         elif self.winner.alive:
             potential = self.game.get_points()
         self.points = points
         self.potential = potential
-        self.save()
 
 class TeamDepth(models.Model):
     bracket = models.ForeignKey(Bracket, on_delete=models.CASCADE)
@@ -365,3 +505,70 @@ class TeamDepth(models.Model):
     depth = models.IntegerField(default=0)
 
 
+
+# One outcome of the remaining games, and who gets paid in it.
+# (See bracketeering/scenarios.py and initdb/run_scenarios.py)
+class Scenario(models.Model):
+    # bit j is set if team1 wins the jth undecided game (counting down from the highest gid)
+    sid = models.IntegerField(unique=True)
+    # winners of the final games, comma separated, from the highest gid down to the championship
+    winners = models.TextField()
+    probability = models.FloatField()
+    # ties are separated by pipes
+    sum_of_2_points = models.IntegerField()
+    sum_of_2_winner = models.CharField(max_length=200)
+    sum_of_2_bids = models.CharField(max_length=200)
+    best_points = models.IntegerField()
+    best_winner = models.CharField(max_length=200)
+    best_bid = models.CharField(max_length=200)
+
+    def __str__(self):
+        return "Scenario: " + str(self.sid)
+
+    def get_winners(self):
+        return self.winners.split(',')
+
+# A running recompute that was started this many seconds ago has lost its
+# worker (e.g. the instance was shut down in the middle of it). See jobs.py.
+kRecomputeTimeout = 600
+
+# A pending recompute of the slots, brackets, owners and payouts. (See jobs.py)
+class RecomputeJob(models.Model):
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    # a retry is not run before this (see jobs.py)
+    not_before = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return "Recompute " + str(self.id) + ": " + self.status
+
+    @staticmethod
+    def stale():
+        cutoff = timezone.now() - timedelta(seconds=kRecomputeTimeout)
+        return RecomputeJob.objects.filter(status=RecomputeJob.RUNNING, started__lt=cutoff)
+
+    @staticmethod
+    def is_updating():
+        running = models.Q(status=RecomputeJob.RUNNING, started__gte=timezone.now() - timedelta(seconds=kRecomputeTimeout))
+        return RecomputeJob.objects.filter(models.Q(status=RecomputeJob.PENDING) | running).exists()
+
+# A snapshot of the tournament after the last recompute: the winners, the teams
+# still alive and every bracket's scores, as one JSON blob. There is only one
+# row. version goes up every time it is rebuilt, so readers can tell whether
+# anything changed without loading it. (See state.py)
+class TournamentState(models.Model):
+    version = models.IntegerField(default=0)
+    data = models.TextField(default='{}')
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return "Tournament state " + str(self.version)
@@ -0,0 +1,44 @@
+from bracketeering.models import Owner, Bracket, Game, Slot, Team, TeamDepth, kGameInfo
+
+# Prefetch plans for the pages. Each function loads everything its template
+# touches, with the related rows joined in, so a page takes the same small
+# number of queries no matter how many brackets there are.
+# (The query counts are checked in tests.py.)
+
+def draft_page():
+    return {'brackets': Bracket.objects.select_related('owner')}
+
+# 2 queries
+def bracket_page(bid):
+    bracket = Bracket.objects.select_related('owner').filter(bid=bid).first()
+    slots = Slot.objects.filter(bracket=bracket).select_related('game', 'winner')
+    return {'bracket': bracket, 'slots': slots}
+
+# 2 queries
+def owner_page(name):
+    owner = Owner.get_by_name(name)
+    brackets = Bracket.objects.filter(owner=owner)
+    return {'owner': owner, 'brackets': brackets}
+
+# 3 queries
+def game_page(gid):
+    game = Game.objects.select_related('winner', 'team1', 'team2').filter(gid=gid).first()
+    context = {'game': game, 'prev_game1': None, 'prev_game2': None, 'next_game': None}
+    if game:
+        # the neighboring games, in one query
+        info = kGameInfo[game.gid]
+        gids = [g for g in info.children + (info.parent,) if g]
+        neighbors = {}
+        for neighbor in Game.objects.select_related('team1', 'team2').filter(gid__in=gids):
+            neighbors[neighbor.gid] = neighbor
+        context['prev_game1'] = neighbors.get(2 * gid)
+        context['prev_game2'] = neighbors.get(2 * gid + 1)
+        context['next_game'] = neighbors.get(info.parent)
+    context['slots'] = Slot.objects.filter(game=game).select_related('winner', 'bracket__owner')
+    return context
+
+# 2 queries
+def team_page(name):
+    team = Team.get_by_name(name)
+    depths = TeamDepth.objects.filter(team=team).select_related('bracket__owner')
+    return {'team': team, 'depths': depths}
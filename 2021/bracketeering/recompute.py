@@ -0,0 +1,39 @@
+from django.db import transaction
+from bracketeering.models import Owner, Bracket, Slot
+from bracketeering.leaderboard import rebuild_leaderboard
+from bracketeering.state import rebuild_state
+
+# Rescore every slot, bracket and owner from the game results, and update the
+# payouts. Everything is computed in memory from one query per table, then
+# written back with bulk updates in a single transaction, so the number of
+# queries does not grow with the number of brackets.
+def recompute_all():
+    with transaction.atomic():
+        owners = list(Owner.objects.all())
+        brackets = list(Bracket.objects.all())
+        slots = list(Slot.objects.select_related('game', 'winner'))
+
+        bracket_slots = {bracket.id: [] for bracket in brackets}
+        changed_slots = []
+        for slot in slots:
+            old = (slot.points, slot.potential)
+            slot.score()
+            if (slot.points, slot.potential) != old:
+                changed_slots.append(slot)
+            bracket_slots[slot.bracket_id].append(slot)
+        Slot.objects.bulk_update(changed_slots, ['points', 'potential'])
+
+        owner_brackets = {owner.id: [] for owner in owners}
+        for bracket in brackets:
+            bracket.score(bracket_slots[bracket.id])
+            owner_brackets[bracket.owner_id].append(bracket)
+        Bracket.objects.bulk_update(brackets, ['points_norm', 'points_bonus', 'potential_norm', 'potential_bonus', 'elite_eight', 'elite_eight_pot'])
+
+        for owner in owners:
+            owner.score(owner_brackets[owner.id])
+        # also saves the owners' scores
+        Owner.update_payouts(owners, brackets)
+
+        # the snapshot is committed along with the scores
+        rebuild_state(brackets)
+        transaction.on_commit(rebuild_leaderboard)
@@ -0,0 +1,232 @@
+from django.db import transaction
+from django.db.models import Count, Min
+from bracketeering.models import Bracket, Game, Slot, Team, Scenario, kGameInfo
+
+# Enumerates every outcome of the last `num_games` games of the tournament
+# (7 = Elite Eight onward, 15 = Sweet Sixteen onward, ...) and works out the
+# sum of 2 and best bracket winners of each one.
+#
+# The picks are loaded with one query into integer lists indexed by gid, so
+# scoring a scenario is just comparing team ids. Every game before the final
+# ones must already be decided; their points (and bonuses) are the same in
+# every scenario, so they are only added up once.
+
+kScenarioGames = 7
+
+# probs[(team1 id, team2 id)] = probability that team1 beats team2
+def run_scenarios(probs, num_games=kScenarioGames):
+    if (num_games + 1) & num_games:
+        raise ValueError("num_games must cover whole rounds (1, 3, 7, 15, 31 or 63)")
+
+    games = {game.gid: game for game in Game.objects.all()}
+    teams = {team.id: team for team in Team.objects.all()}
+    brackets = list(Bracket.objects.select_related('owner').order_by('bid'))
+    index = {bracket.id: i for i, bracket in enumerate(brackets)}
+
+    # picks[i][gid] = the team id bracket i picked to win game gid
+    picks = [[0] * 128 for bracket in brackets]
+    base = [0 for bracket in brackets]
+    groups = {} # (bracket index, bonus key) -> all picks right so far
+    for bracket_id, gid, team_id, points in Slot.objects.values_list('bracket_id', 'game__gid', 'winner_id', 'points'):
+        i = index[bracket_id]
+        picks[i][gid] = team_id
+        if gid > num_games:
+            base[i] += points
+            key = Game.get_bonus_key_by_gid(gid)
+            if key:
+                groups[(i, key)] = groups.get((i, key), True) and points > 0
+    for (i, key), perfect in groups.items():
+        if perfect:
+            base[i] += 5
+
+    for gid, game in games.items():
+        if gid > num_games and not game.winner_id:
+            raise ValueError("Game %d is not decided, and is not one of the final %d games" % (gid, num_games))
+
+    # final games, children before parents
+    final_gids = list(range(num_games, 0, -1))
+    undecided = [gid for gid in final_gids if not games[gid].winner_id]
+    bits = {gid: j for j, gid in enumerate(undecided)}
+    # the bonus groups in the final games. (the rest were added to base)
+    bonus_groups = {}
+    for gid in final_gids:
+        key = Game.get_bonus_key_by_gid(gid)
+        if key:
+            bonus_groups.setdefault(key, []).append(gid)
+    bonus_groups = list(bonus_groups.values())
+
+    owners = {} # owners[name] = [bracket index, ...]
+    for i, bracket in enumerate(brackets):
+        owners.setdefault(bracket.owner.name, []).append(i)
+
+    scenarios = []
+    for sid in range(1 << len(undecided)):
+        # generate winners list. calculate probability of outcome.
+        winners = [0] * 128
+        prob = 1.
+        for gid in final_gids:
+            game = games[gid]
+            if game.winner_id:
+                winners[gid] = game.winner_id
+                continue
+            team1 = game.team1_id or winners[2 * gid]
+            team2 = game.team2_id or winners[2 * gid + 1]
+            if sid & 1 << bits[gid]:
+                prob *= probs[(team1, team2)]
+                winners[gid] = team1
+            else:
+                prob *= probs[(team2, team1)]
+                winners[gid] = team2
+
+        # calculate bracket pts for each bracket
+        bracket_pts = []
+        for i in range(len(brackets)):
+            pick = picks[i]
+            pts = base[i]
+            for gid in final_gids:
+                if pick[gid] == winners[gid]:
+                    pts += kGameInfo[gid].points
+            for group in bonus_groups:
+                for gid in group:
+                    if pick[gid] != winners[gid]:
+                        break
+                else:
+                    pts += 5
+            bracket_pts.append(pts)
+
+        scenario = Scenario(sid=sid, probability=prob)
+        scenario.winners = ','.join(teams[winners[gid]].name for gid in final_gids)
+        set_payouts(scenario, owners, brackets, bracket_pts)
+        scenarios.append(scenario)
+    return scenarios
+
+# Fill in the sum of 2 and best bracket winners. Ties are separated by pipes.
+def set_payouts(scenario, owners, brackets, bracket_pts):
+    best_bracket = [0, "", ""] # [pts, "owner", "bid"]
+    best_sum_of_2 = [0, "", ""] # [pts, "owner", "bid1&bid2"]
+    for owner, indexes in owners.items():
+        owner_bs = sorted((bracket_pts[i], brackets[i].bid) for i in indexes)
+
+        if owner_bs[-1][0] > best_bracket[0]:
+            best_bracket = [owner_bs[-1][0], owner, str(owner_bs[-1][1])]
+        elif owner_bs[-1][0] == best_bracket[0]:
+            best_bracket[1] += "|" + owner
+            best_bracket[2] += "|" + str(owner_bs[-1][1])
+
+        owner_sum_of_2 = owner_bs[-1][0] + owner_bs[-2][0]
+        if owner_sum_of_2 > best_sum_of_2[0]:
+            best_sum_of_2 = [owner_sum_of_2, owner, str(owner_bs[-1][1]) + "&" + str(owner_bs[-2][1])]
+        elif owner_sum_of_2 == best_sum_of_2[0]:
+            best_sum_of_2[1] += "|" + owner
+            best_sum_of_2[2] += "|" + str(owner_bs[-1][1]) + "&" + str(owner_bs[-2][1])
+
+    scenario.sum_of_2_points, scenario.sum_of_2_winner, scenario.sum_of_2_bids = best_sum_of_2
+    scenario.best_points, scenario.best_winner, scenario.best_bid = best_bracket
+
+# Replace the stored scenarios
+def save_scenarios(scenarios):
+    with transaction.atomic():
+        Scenario.objects.all().delete()
+        Scenario.objects.bulk_create(scenarios, batch_size=1000)
+
+# Read scenarios written in the old CSV format (e.g. the archived 2021 Elite
+# Eight run in initdb/scenarios.csv): the winners from the highest gid down,
+# then the probability and the payout columns, in Scenario's order. The rows
+# are numbered in file order.
+def read_scenarios_csv(path):
+    scenarios = []
+    lines = open(path).read().split('\n')
+    for sid, line in enumerate(line for line in lines[1:] if line):
+        # (every line ends with a comma)
+        values = line.split(',')[:-1]
+        scenario = Scenario(sid=sid, winners=','.join(values[:-7]), probability=float(values[-7]))
+        scenario.sum_of_2_points, scenario.sum_of_2_winner, scenario.sum_of_2_bids = int(values[-6]), values[-5], values[-4]
+        scenario.best_points, scenario.best_winner, scenario.best_bid = int(values[-3]), values[-2], values[-1]
+        scenarios.append(scenario)
+    return scenarios
+
+# Answers "who wins if ..." questions about the stored scenarios.
+#
+# For every (gid, team) the scenarios where the team wins that game are kept as
+# a bitset (bit i = the ith scenario). A set of given winners is then just the
+# AND of their bitsets, and each owner's odds are the sum of the probabilities
+# of the scenarios in (given & owner's wins).
+class ScenarioIndex(object):
+    def __init__(self, scenarios):
+        self.gids = []
+        self.probabilities = []
+        self.by_winner = {} # (gid, team name) -> bitset
+        self.sum_of_2 = {} # winner(s) -> bitset
+        self.best = {} # winner(s) -> bitset
+        for i, scenario in enumerate(scenarios):
+            bit = 1 << i
+            winners = scenario.get_winners()
+            if not self.gids:
+                self.gids = list(range(len(winners), 0, -1))
+            for gid, name in zip(self.gids, winners):
+                self.by_winner[(gid, name)] = self.by_winner.get((gid, name), 0) | bit
+            self.sum_of_2[scenario.sum_of_2_winner] = self.sum_of_2.get(scenario.sum_of_2_winner, 0) | bit
+            self.best[scenario.best_winner] = self.best.get(scenario.best_winner, 0) | bit
+            self.probabilities.append(scenario.probability)
+        self.all = (1 << len(self.probabilities)) - 1
+
+    # The teams that can win a game
+    def get_teams(self, gid):
+        return sorted(name for (g, name), bits in self.by_winner.items() if g == gid and bits)
+
+    # The game where two teams would meet (the earliest round game both could
+    # win, i.e. the highest gid), or None
+    def get_meeting_game(self, team1, team2):
+        for gid in sorted(self.gids, reverse=True):
+            if self.by_winner.get((gid, team1)) and self.by_winner.get((gid, team2)):
+                return gid
+        return None
+
+    # givens = {gid: team name}. Returns the bitset of matching scenarios.
+    def matching(self, givens={}):
+        bits = self.all
+        for gid, name in givens.items():
+            bits &= self.by_winner.get((gid, name), 0)
+        return bits
+
+    def probability(self, bits):
+        prob = 0.
+        while bits:
+            low = bits & -bits
+            prob += self.probabilities[low.bit_length() - 1]
+            bits ^= low
+        return prob
+
+    # Same as the old read_scenarios.summarize: {winner(s): [sum of 2 prob, best prob]}
+    def summarize(self, givens={}):
+        bits = self.matching(givens)
+        ret = {}
+        for name, wins in self.sum_of_2.items():
+            if bits & wins:
+                ret.setdefault(name, [0, 0])[0] = self.probability(bits & wins)
+        for name, wins in self.best.items():
+            if bits & wins:
+                ret.setdefault(name, [0, 0])[1] = self.probability(bits & wins)
+        return ret
+
+    # [[winner(s), sum of 2 %, best %]], sorted by name, given the winners
+    def get_odds(self, givens={}):
+        summary = self.summarize(givens)
+        prob = self.probability(self.matching(givens))
+        rows = []
+        if prob != 0:
+            for name in sorted(summary):
+                rows.append([name, summary[name][0] / prob * 100, summary[name][1] / prob * 100])
+        return rows
+
+# The index is rebuilt only when the stored scenarios change
+scenario_index = [None, None] # [key, index]
+
+def get_scenario_index():
+    # save_scenarios replaces every row, so new scenarios have new ids
+    key = Scenario.objects.aggregate(Min('id'), Count('id'))
+    if scenario_index[0] != key:
+        scenarios = Scenario.objects.order_by('sid').only('winners', 'probability', 'sum_of_2_winner', 'best_winner')
+        scenario_index[0] = key
+        scenario_index[1] = ScenarioIndex(scenarios)
+    return scenario_index[1]
@@ -0,0 +1,88 @@
+import json
+from django.db import transaction
+from django.utils import timezone
+from bracketeering.models import Bracket, Game, Team, TournamentState
+
+# The tournament as of the last recompute, in one row: instead of re-deriving
+# it from the Game, Team and Bracket tables, readers load the TournamentState
+# blob. It is rebuilt in the same transaction as the scores it describes, and
+# its version goes up every time, so a reader that already has the current
+# version (see get_state) does not load or parse it again.
+#
+# The row is created by migration 0013, at version 0, and only written by the
+# recomputes. Until the first one, readers build the state in memory instead.
+#
+# {
+#     'version': 12,
+#     'updated': '2021-03-28T02:31:14.520Z',
+#     'winners': [team id or 0, ...], # indexed by gid, like kGameInfo
+#     'alive': [team id, ...],
+#     'brackets': {bid: [points_norm, points_bonus, potential_norm, potential_bonus, elite_eight, elite_eight_pot]},
+# }
+
+kStateId = 1
+kBracketFields = ['points_norm', 'points_bonus', 'potential_norm', 'potential_bonus', 'elite_eight', 'elite_eight_pot']
+
+# brackets can be passed in, if they are already loaded
+def build_state(brackets=None):
+    if brackets is None:
+        brackets = Bracket.objects.all()
+    winners = [0] * 128
+    for gid, winner_id in Game.objects.filter(winner__isnull=False).values_list('gid', 'winner_id'):
+        winners[gid] = winner_id
+    return {
+        'winners': winners,
+        'alive': sorted(Team.objects.filter(alive=True).values_list('id', flat=True)),
+        # (a list, since JSON keys are strings)
+        'brackets': sorted([bracket.bid] + [getattr(bracket, field) for field in kBracketFields] for bracket in brackets),
+    }
+
+# Call inside the transaction that changed the scores, so the snapshot is
+# never out of step with them.
+def rebuild_state(brackets=None):
+    with transaction.atomic():
+        # lock the row, so two rebuilds can't end up with the same version
+        state = TournamentState.objects.select_for_update().filter(id=kStateId).first()
+        if state is None:
+            # (only if the row was deleted since the migration)
+            state = TournamentState(id=kStateId)
+        state.version += 1
+        state.data = json.dumps(build_state(brackets), separators=(',', ':'))
+        state.save()
+    return state.version
+
+# (version, updated). The time tells apart a version number that was reused
+# because the row was deleted and rebuilt. Version 0 = not built yet.
+def get_state_key():
+    key = TournamentState.objects.filter(id=kStateId).values_list('version', 'updated').first()
+    if key is None:
+        return (0, None)
+    return key
+
+def get_state_version():
+    return get_state_key()[0]
+
+def parse_state(state):
+    return finish_state(json.loads(state.data), state.version, state.updated)
+
+# Add the version to a build_state() result, and key the brackets by bid
+def finish_state(data, version, updated):
+    data['version'] = version
+    data['updated'] = updated.isoformat()
+    data['brackets'] = {row[0]: row[1:] for row in data['brackets']}
+    return data
+
+# The last state loaded by this process: [key, state]
+loaded_state = [None, None]
+
+# The current state. Only the version is read, unless it changed.
+def get_state():
+    key = get_state_key()
+    if key[0] == 0:
+        # Nothing to cache: the tables can change without a new version
+        return finish_state(build_state(), 0, timezone.now())
+    if loaded_state[0] != key:
+        state = TournamentState.objects.get(id=kStateId)
+        loaded_state[0] = (state.version, state.updated)
+        loaded_state[1] = parse_state(state)
+    return loaded_state[1]
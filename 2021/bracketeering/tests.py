@@ -1,3 +1,225 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.utils import timezone
+from django.test import TestCase, TransactionTestCase
 
-# Create your tests here.
+from bracketeering.models import *
+from bracketeering.leaderboard import rebuild_leaderboard, get_leaderboard
+from bracketeering.jobs import enqueue_recompute, run_pending_jobs
+from bracketeering.state import get_state
+
+class TournamentTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # A four team tournament: games 2 and 3, then the championship (game 1)
+        teams = []
+        for i, name in enumerate(["Gonzaga", "Baylor", "Illinois", "Michigan"]):
+            teams.append(Team.objects.create(name=name, overall_seed=i + 1, seed=1))
+        Game.objects.create(gid=1)
+        Game.objects.create(gid=2, team1=teams[0], team2=teams[3])
+        Game.objects.create(gid=3, team1=teams[1], team2=teams[2])
+        cls.teams = teams
+        cls.owners = [Owner.objects.create(name=name) for name in ["Alex", "Bill"]]
+        cls.add_brackets(4)
+
+    @classmethod
+    def add_brackets(cls, count):
+        games = list(Game.objects.order_by('gid'))
+        start = Bracket.objects.count()
+        for bid in range(start + 1, start + count + 1):
+            bracket = Bracket.objects.create(bid=bid, owner=cls.owners[bid % 2])
+            picks = [cls.teams[bid % 4], cls.teams[0], cls.teams[1]]
+            for game, team in zip(games, picks):
+                Slot.objects.create(bracket=bracket, game=game, winner=team)
+            for team in cls.teams:
+                TeamDepth.objects.create(bracket=bracket, team=team, depth=bid % 3)
+
+# The pages should take a fixed number of queries, no matter how many brackets
+# there are. (See queries.py)
+class PageQueriesTest(TournamentTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def assertPageQueries(self, num, url):
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # more brackets should not mean more queries
+        PageQueriesTest.add_brackets(8)
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_bracket_page(self):
+        self.assertPageQueries(2, '/bracket/1/')
+
+    def test_owner_page(self):
+        self.assertPageQueries(2, '/owner/Alex/')
+
+    def test_game_page(self):
+        self.assertPageQueries(3, '/game/2/')
+
+    def test_team_page(self):
+        self.assertPageQueries(2, '/team/Gonzaga/')
+
+    def test_draft_page(self):
+        self.assertPageQueries(1, '/draft/')
+
+    def test_main_page(self):
+        # the leaderboard comes from the cache: one read each for the ETag,
+        # Last-Modified and the page itself, plus the recompute status for the
+        # ETag and the page, and the check for jobs left without a worker
+        rebuild_leaderboard()
+        with self.assertNumQueries(6):
+            response = self.client.get('/')
+        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(3):
+            response = self.client.get('/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+# Edits outside of Game.set_winner (e.g. in the admin) drop the cached
+# leaderboard once they commit. (TestCase never commits, so this can't use it.)
+class LeaderboardCacheTest(TransactionTestCase):
+
+    def test_owner_edit(self):
+        cache.clear()
+        owner = Owner.objects.create(name="Alex")
+        first = get_leaderboard()
+        self.assertEqual(first['owners'][0]['payout'], owner.payout)
+
+        owner.payout = 250
+        owner.save()
+        second = get_leaderboard()
+        self.assertEqual(second['owners'][0]['payout'], 250)
+        self.assertNotEqual(second['etag'], first['etag'])
+
+        owner.delete()
+        self.assertEqual(get_leaderboard()['owners'], [])
+
+# A full 64 team bracket, decided through the Sweet Sixteen (team1 always
+# wins), so the 7 games left are enumerated exactly.
+class WhatIfTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # team "T<position>" starts at position 64..127, like the bracket
+        teams = {}
+        for position in range(64, 128):
+            teams[position] = Team.objects.create(name="T%d" % position, overall_seed=position - 63, seed=1)
+        for gid in range(1, 64):
+            game = Game(gid=gid)
+            if gid >= 32:
+                game.team1 = teams[2 * gid]
+                game.team2 = teams[2 * gid + 1]
+            if gid >= 8:
+                game.winner = teams[gid << (7 - gid.bit_length())]
+            game.save()
+        owners = [Owner.objects.create(name=name) for name in ["Alex", "Bill"]]
+        for bid in range(1, 5):
+            bracket = Bracket.objects.create(bid=bid, owner=owners[bid % 2])
+            for game in Game.objects.all():
+                # the leftmost or rightmost team under the game
+                shift = 7 - game.gid.bit_length()
+                position = game.gid << shift if bid % 2 else ((game.gid + 1) << shift) - 1
+                Slot.objects.create(bracket=bracket, game=game, winner=teams[position])
+
+    def test_same_team_twice(self):
+        # T120 wins game 15. Giving it games 7 and 3 works in either order.
+        first = self.client.get('/whatif/?g3=T120&g7=T120')
+        second = self.client.get('/whatif/?g7=T120&g3=T120')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.json(), second.json())
+        self.assertTrue(first.json()['exact'])
+
+    def test_unknown_game(self):
+        for gid in [0, 100, 999]:
+            response = self.client.get('/whatif/?g%d=T120' % gid)
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json()['error'], "Unknown game: %d" % gid)
+
+class RecomputeJobTest(TestCase):
+
+    def test_coalesce(self):
+        # results entered before the worker runs share one job
+        first = enqueue_recompute(start_thread=False)
+        second = enqueue_recompute(start_thread=False)
+        self.assertEqual(first.id, second.id)
+        self.assertTrue(RecomputeJob.is_updating())
+
+        self.assertEqual(run_pending_jobs(), 1)
+        first.refresh_from_db()
+        self.assertEqual(first.status, RecomputeJob.DONE)
+        self.assertFalse(RecomputeJob.is_updating())
+        self.assertEqual(run_pending_jobs(), 0)
+
+    def test_retry_later(self):
+        # a failed recompute is retried, but not right away
+        enqueue_recompute(start_thread=False)
+        with mock.patch('bracketeering.jobs.recompute_all', side_effect=RuntimeError("database is locked")):
+            self.assertEqual(run_pending_jobs(), 1)
+        retry = RecomputeJob.objects.get(status=RecomputeJob.PENDING)
+        self.assertGreater(retry.not_before, timezone.now())
+        self.assertTrue(RecomputeJob.is_updating())
+        self.assertEqual(run_pending_jobs(), 0)
+
+        retry.not_before = timezone.now() - timedelta(seconds=1)
+        retry.save()
+        self.assertEqual(run_pending_jobs(), 1)
+        retry.refresh_from_db()
+        self.assertEqual(retry.status, RecomputeJob.DONE)
+
+    def test_result_during_retry(self):
+        # a new result joins the waiting retry, and runs right away
+        enqueue_recompute(start_thread=False)
+        with mock.patch('bracketeering.jobs.recompute_all', side_effect=RuntimeError("database is locked")):
+            run_pending_jobs()
+        retry = RecomputeJob.objects.get(status=RecomputeJob.PENDING)
+        self.assertEqual(enqueue_recompute(start_thread=False).id, retry.id)
+        self.assertEqual(run_pending_jobs(), 1)
+
+    def test_lost_worker(self):
+        # a job whose worker died mid-recompute is failed and retried
+        job = enqueue_recompute(start_thread=False)
+        started = timezone.now() - timedelta(seconds=kRecomputeTimeout + 1)
+        RecomputeJob.objects.filter(id=job.id).update(status=RecomputeJob.RUNNING, started=started)
+        self.assertFalse(RecomputeJob.is_updating())
+
+        self.assertEqual(run_pending_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, RecomputeJob.FAILED)
+        retry = RecomputeJob.objects.exclude(id=job.id).get()
+        self.assertEqual(retry.status, RecomputeJob.DONE)
+        self.assertFalse(RecomputeJob.is_updating())
+
+class TournamentStateTest(TournamentTestCase):
+
+    def test_state(self):
+        # before the first recompute the state is built without writing it
+        first = get_state()
+        self.assertEqual(first['version'], 0)
+        self.assertEqual(first['winners'][2], 0)
+        self.assertEqual(len(first['alive']), 4)
+        self.assertEqual(len(first['brackets']), 4)
+        self.assertEqual(TournamentState.objects.get().version, 0)
+        self.assertNotIn('ETag', self.client.get('/state/'))
+
+        Game.get_by_gid(2).set_winner(True, background=False)
+        second = get_state()
+        self.assertEqual(second['version'], 1)
+        self.assertEqual(second['winners'][2], self.teams[0].id)
+        self.assertNotIn(self.teams[3].id, second['alive'])
+        # every bracket picked Gonzaga in game 2 (a Final Four game)
+        self.assertEqual(second['brackets'][4][0], 8)
+
+        # nothing changed: only the version is read
+        with self.assertNumQueries(1):
+            self.assertIs(get_state(), second)
+
+        response = self.client.get('/state/')
+        self.assertEqual(response.json()['version'], second['version'])
+        response = self.client.get('/state/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
@@ -1,5 +1,14 @@
-from django.views.generic import TemplateView
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views.generic import TemplateView, View
 from bracketeering.models import *
+from bracketeering.queries import *
+from bracketeering.scenarios import get_scenario_index
+from bracketeering.whatif import what_if
+from bracketeering.leaderboard import get_leaderboard, leaderboard_etag, leaderboard_last_modified
+from bracketeering.state import get_state, get_state_version
+from bracketeering.jobs import check_jobs
 
 class AboutView(TemplateView):
     template_name = 'about.html'
@@ -9,81 +18,142 @@ class DraftView(TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super(DraftView, self).get_context_data(**kwargs)
-        context['brackets'] = Bracket.objects.all()
+        context.update(draft_page())
         return context
 
+# The leaderboard comes from the cache (see leaderboard.py). Browsers that
+# already have the current version get a 304.
+@method_decorator(condition(etag_func=leaderboard_etag, last_modified_func=leaderboard_last_modified), name='dispatch')
 class MainView(TemplateView):
     template_name = 'main.html'
 
     def get_context_data(self, **kwargs):
         context = super(MainView, self).get_context_data(**kwargs)
-        context['brackets'] = Bracket.objects.all()
-        context['owners'] = Owner.objects.all()
+        leaderboard = get_leaderboard()
+        context['brackets'] = leaderboard['brackets']
+        context['owners'] = leaderboard['owners']
+        check_jobs()
+        context['updating'] = RecomputeJob.is_updating()
         return context
 
+# Whether results are still being applied, for polling
+class StatusView(View):
+
+    def get(self, request, *args, **kwargs):
+        check_jobs()
+        last = RecomputeJob.objects.filter(status=RecomputeJob.DONE).order_by('-finished').first()
+        return JsonResponse({
+            'updating': RecomputeJob.is_updating(),
+            'last_update': last.finished if last else None,
+        })
+
+# (no ETag before the first recompute, when the state is built on every request)
+def state_etag(request, *args, **kwargs):
+    version = get_state_version()
+    return str(version) if version else None
+
+# The tournament state snapshot (see state.py). Clients that send the version
+# they have back as If-None-Match get a 304 until the next recompute.
+@method_decorator(condition(etag_func=state_etag), name='dispatch')
+class StateView(View):
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(get_state())
+
 class BracketView(TemplateView):
     template_name = 'bracket.html'
-    bracket = None
-    slots = []
+    page = {}
 
     def dispatch(self, request, *args, **kwargs):
         # get the bracket by bid
-        self.bracket = Bracket.get_by_bid(kwargs['bid'])
-        self.slots = Slot.objects.filter(bracket=self.bracket)
+        self.page = bracket_page(kwargs['bid'])
         return super(BracketView, self).dispatch(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super(BracketView, self).get_context_data(**kwargs)
-        context['bracket'] = self.bracket
-        context['slots'] = self.slots
+        context.update(self.page)
         return context
 
 class OwnerView(TemplateView):
     template_name = 'owner.html'
-    owner = None
-    brackets = []
+    page = {}
 
     def dispatch(self, request, *args, **kwargs):
-        # get the bracket by bid
-        self.owner = Owner.get_by_name(kwargs['name'])
-        self.brackets = Bracket.objects.filter(owner=self.owner)
+        # get the owner by name
+        self.page = owner_page(kwargs['name'])
         return super(OwnerView, self).dispatch(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super(OwnerView, self).get_context_data(**kwargs)
-        context['owner'] = self.owner
-        context['brackets'] = self.brackets
+        context.update(self.page)
         return context
 
 class GameView(TemplateView):
     template_name = 'game.html'
-    game = None
-    slots = []
+    page = {}
 
     def dispatch(self, request, *args, **kwargs):
-        self.game = Game.get_by_gid(kwargs['gid'])
-        self.slots = Slot.objects.filter(game=self.game)
+        self.page = game_page(kwargs['gid'])
         return super(GameView, self).dispatch(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super(GameView, self).get_context_data(**kwargs)
-        context['game'] = self.game
-        context['slots'] = self.slots
+        context.update(self.page)
         return context
 
 class TeamView(TemplateView):
     template_name = 'team.html'
-    team = None
-    depths = []
+    page = {}
 
     def dispatch(self, request, *args, **kwargs):
-        self.team = Team.get_by_name(kwargs['name'])
-        self.depths = TeamDepth.objects.filter(team=self.team)
+        self.page = team_page(kwargs['name'])
         return super(TeamView, self).dispatch(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super(TeamView, self).get_context_data(**kwargs)
-        context['team'] = self.team
-        context['depths'] = self.depths
+        context.update(self.page)
+        return context
+
+# "Who wins if ..." over the stored scenarios. Given winners come in as
+# ?g<gid>=<team>, and ?winner=<team>&loser=<team> sets the game where they meet.
+class ScenarioView(TemplateView):
+    template_name = 'scenarios.html'
+
+    def get_context_data(self, **kwargs):
+        context = super(ScenarioView, self).get_context_data(**kwargs)
+        index = get_scenario_index()
+        givens = {}
+        for gid in index.gids:
+            name = self.request.GET.get('g' + str(gid))
+            if name:
+                givens[gid] = name
+        winner = self.request.GET.get('winner')
+        loser = self.request.GET.get('loser')
+        if winner and loser:
+            gid = index.get_meeting_game(winner, loser)
+            if gid:
+                givens[gid] = winner
+        context['games'] = [[gid, index.get_teams(gid), givens.get(gid)] for gid in index.gids]
+        context['odds'] = index.get_odds(givens)
         return context
 
+# Each owner's share of the payouts, given hypothetical winners (see whatif.py).
+# Same parameters as ScenarioView: ?g<gid>=<team> and ?winner=<team>&loser=<team>
+class WhatIfView(View):
+
+    def get(self, request, *args, **kwargs):
+        givens = {}
+        for name, value in request.GET.items():
+            if name[:1] == 'g' and name[1:].isdigit() and value:
+                givens[int(name[1:])] = value.replace('-', ' ')
+        beats = []
+        if request.GET.get('winner') and request.GET.get('loser'):
+            beats.append((request.GET['winner'].replace('-', ' '), request.GET['loser'].replace('-', ' ')))
+        try:
+            shares, exact = what_if(givens, beats)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        owners = {}
+        for name, [sum_of_2, best, elite_eight] in shares.items():
+            owners[name] = {'sum_of_2': sum_of_2, 'best_bracket': best, 'elite_eight': elite_eight}
+        return JsonResponse({'exact': exact, 'owners': owners})
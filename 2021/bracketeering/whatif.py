@@ -0,0 +1,244 @@
+import csv
+import random
+from django.conf import settings
+from bracketeering.models import Bracket, Game, Slot, Team, kGameInfo
+from bracketeering.state import get_state
+
+# Each owner's share of the sum of 2, best bracket and elite eight payouts,
+# given some hypothetical winners. (See WhatIfView)
+#
+# With few games left, every outcome is enumerated and the shares are exact.
+# Otherwise they come from kWhatIfSims simulations, using the 538 ratings. The
+# results are memoized by the given winners (and the version of the tournament
+# state they were computed from), so asking the same question again is instant.
+# The real results come from the state snapshot, so the odds always match the
+# scores on the leaderboard.
+
+kWhatIfSims = 5000
+kMaxExactGames = 12
+kMaxCachedResults = 256
+kSeed = 2021
+kRatingsPath = settings.BASE_DIR / 'initdb' / 'data' / '538_forecast.csv'
+
+# 538's win probability, from the difference of the team ratings
+def win_probability(rating1, rating2):
+    return 1. / (1. + pow(10., -(rating1 - rating2) * 30.464 / 400.))
+
+ratings = {} # team name -> 538 rating
+
+def load_ratings():
+    if not ratings:
+        for row in csv.DictReader(open(kRatingsPath)):
+            ratings[row['team_name']] = float(row['team_rating'])
+    return ratings
+
+class WhatIf(object):
+    def __init__(self, state=None):
+        if state is None:
+            state = get_state()
+        games = {game.gid: game for game in Game.objects.all()}
+        teams = {team.id: team for team in Team.objects.all()}
+        self.teams = {team.id: team.name for team in teams.values()}
+        self.names = {team.name: team.id for team in teams.values()}
+        team_ratings = load_ratings()
+        self.ratings = {team_id: team_ratings.get(team.name, 0.) for team_id, team in teams.items()}
+
+        # Same layout as the bracket: the teams playing game gid come from
+        # positions 2 * gid and 2 * gid + 1. The First Four games sit where
+        # their winner goes, and their teams below them.
+        self.play_ins = sorted(gid for gid in games if gid > 63)
+        self.order = self.play_ins + list(range(63, 0, -1))
+        self.leaves = {}
+        self.positions = {} # team id -> position
+        for gid in self.play_ins:
+            self.positions[games[gid].team1_id] = 2 * gid
+            self.positions[games[gid].team2_id] = 2 * gid + 1
+            self.leaves[2 * gid] = games[gid].team1_id
+            self.leaves[2 * gid + 1] = games[gid].team2_id
+        for gid in range(32, 64):
+            for position, team_id in [(2 * gid, games[gid].team1_id), (2 * gid + 1, games[gid].team2_id)]:
+                if position not in games:
+                    self.positions[team_id] = position
+                    self.leaves[position] = team_id
+        self.truth = {gid: team_id for gid, team_id in enumerate(state['winners']) if team_id}
+
+        # picks[gid][team id] = the brackets that pick the team to win the game
+        brackets = list(Bracket.objects.select_related('owner').order_by('bid'))
+        index = {bracket.id: i for i, bracket in enumerate(brackets)}
+        self.picks = {gid: {} for gid in self.order}
+        for bracket_id, gid, team_id in Slot.objects.values_list('bracket_id', 'game__gid', 'winner_id'):
+            self.picks[gid].setdefault(team_id, []).append(index[bracket_id])
+        self.num_brackets = len(brackets)
+        self.owners = []
+        owner_brackets = {}
+        for i, bracket in enumerate(brackets):
+            if bracket.owner.name not in owner_brackets:
+                owner_brackets[bracket.owner.name] = []
+                self.owners.append(bracket.owner.name)
+            owner_brackets[bracket.owner.name].append(i)
+        self.owner_brackets = [owner_brackets[name] for name in self.owners]
+
+        # bonus groups
+        keys = {}
+        self.groups = {} # gid -> group index
+        for gid in self.order:
+            key = Game.get_bonus_key_by_gid(gid)
+            if key:
+                self.groups[gid] = keys.setdefault(key, len(keys))
+        self.group_sizes = [0] * len(keys)
+        for gid, group in self.groups.items():
+            self.group_sizes[group] += 1
+
+    # The game where two teams would meet, or None
+    def get_meeting_game(self, team1, team2):
+        if team1 not in self.positions or team2 not in self.positions or team1 == team2:
+            return None
+        a = self.positions[team1]
+        b = self.positions[team2]
+        while a.bit_length() > b.bit_length():
+            a //= 2
+        while b.bit_length() > a.bit_length():
+            b //= 2
+        while a != b:
+            a //= 2
+            b //= 2
+        return a
+
+    # Play out the games. A team that is given a game wins every game before it.
+    # outcome(gid, t1, t2) returns whether t1 wins, for the undecided games.
+    def play(self, givens, outcome):
+        forced = {} # team id -> the latest round game it is given
+        for gid, team_id in givens.items():
+            forced[team_id] = min(gid, forced.get(team_id, gid))
+        winners = dict(self.leaves)
+        for gid in self.order:
+            t1 = winners[2 * gid]
+            t2 = winners[2 * gid + 1]
+            if gid in self.truth:
+                winners[gid] = self.truth[gid]
+            elif t1 in forced and forced[t1] <= gid:
+                winners[gid] = t1
+            elif t2 in forced and forced[t2] <= gid:
+                winners[gid] = t2
+            else:
+                winners[gid] = t1 if outcome(gid, t1, t2) else t2
+        return winners
+
+    def probability(self, t1, t2):
+        return win_probability(self.ratings[t1], self.ratings[t2])
+
+    # Returns (shares, exact). shares[owner] = [sum of 2, best, elite eight]
+    # givens = {gid: team id}
+    def run(self, givens={}, sims=kWhatIfSims):
+        # The givens must be possible
+        check = self.play(givens, lambda gid, t1, t2: True)
+        for gid, team_id in givens.items():
+            if check[gid] != team_id:
+                raise ValueError("%s can't win game %d" % (self.teams[team_id], gid))
+
+        undecided = [gid for gid in self.order if gid not in self.truth and gid not in givens]
+        shares = [[0., 0., 0.] for owner in self.owners]
+        if len(undecided) <= kMaxExactGames:
+            self.enumerate(givens, shares)
+            exact = True
+        else:
+            rng = random.Random(kSeed)
+            def outcome(gid, t1, t2):
+                return rng.random() < self.probability(t1, t2)
+            for i in range(sims):
+                self.pay(self.play(givens, outcome), 1. / sims, shares)
+            exact = False
+        return {name: shares[o] for o, name in enumerate(self.owners)}, exact
+
+    # Every outcome, weighted by its probability
+    def enumerate(self, givens, shares):
+        bits = {}
+        def outcome(gid, t1, t2):
+            bits[gid] = (t1, t2)
+            return True
+        self.play(givens, outcome)
+        # only the games that are still open, with the givens applied
+        open_gids = list(bits.keys())
+        for scenario in range(1 << len(open_gids)):
+            prob = [1.]
+            def outcome(gid, t1, t2):
+                t1_wins = scenario >> open_gids.index(gid) & 1 == 1
+                p = self.probability(t1, t2)
+                prob[0] *= p if t1_wins else 1. - p
+                return t1_wins
+            winners = self.play(givens, outcome)
+            self.pay(winners, prob[0], shares)
+
+    # Score every bracket, then split each payout between the owners that tie
+    def pay(self, winners, weight, shares):
+        points = [0] * self.num_brackets
+        elite_eight = [0] * self.num_brackets
+        hits = [[0] * len(self.group_sizes) for i in range(self.num_brackets)]
+        for gid in self.order:
+            brackets = self.picks[gid].get(winners[gid], ())
+            info = kGameInfo[gid]
+            group = self.groups.get(gid)
+            for b in brackets:
+                points[b] += info.points
+                if group is not None:
+                    hits[b][group] += 1
+                if info.round == 3:
+                    elite_eight[b] += 1
+        for b in range(self.num_brackets):
+            for group, size in enumerate(self.group_sizes):
+                if hits[b][group] == size:
+                    points[b] += 5
+
+        sum_of_2 = []
+        best = []
+        ee = []
+        for indexes in self.owner_brackets:
+            scores = sorted(points[b] for b in indexes)
+            best.append(scores[-1])
+            sum_of_2.append(scores[-1] + scores[-2])
+            # Owner.update_payouts tie breakers: highest max, lowest min, highest 2nd max, ...
+            counts = sorted(elite_eight[b] for b in indexes)
+            key = []
+            for depth in range(len(counts)):
+                if depth % 2 == 0:
+                    key.append(counts[len(counts) - 1 - depth // 2])
+                else:
+                    key.append(-counts[depth // 2])
+            ee.append(key)
+        for i, values in enumerate([sum_of_2, best, ee]):
+            top = max(values)
+            owners = [o for o, value in enumerate(values) if value == top]
+            for o in owners:
+                shares[o][i] += weight / len(owners)
+
+# memoized results: (givens, beats, state version) -> (shares, exact)
+results = {}
+
+# givens = {gid: team name}, beats = [(winner name, loser name)]
+# Returns (shares, exact). shares[owner] = [sum of 2, best, elite eight]
+def what_if(givens={}, beats=[]):
+    tournament = get_state()
+    key = (tuple(sorted(givens.items())), tuple(sorted(beats)), tournament['version'], tournament['updated'])
+    if key not in results:
+        if len(results) >= kMaxCachedResults:
+            results.clear()
+        results[key] = run_what_if(givens, beats, tournament)
+    return results[key]
+
+def run_what_if(givens, beats, tournament=None):
+    state = WhatIf(tournament)
+    team_givens = {}
+    for gid, name in givens.items():
+        if not (0 <= gid < 128 and kGameInfo[gid]):
+            raise ValueError("Unknown game: %d" % gid)
+        if name not in state.names:
+            raise ValueError("Unknown team: " + name)
+        team_givens[gid] = state.names[name]
+    for winner, loser in beats:
+        if winner not in state.names or loser not in state.names:
+            raise ValueError("Unknown team: " + (loser if winner in state.names else winner))
+        gid = state.get_meeting_game(state.names[winner], state.names[loser])
+        if gid is None:
+            raise ValueError("%s and %s can't meet" % (winner, loser))
+        team_givens[gid] = state.names[winner]
+    return state.run(team_givens)
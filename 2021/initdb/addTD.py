@@ -1,27 +1,46 @@
+from django.db import transaction
 from bracketeering.models import *
 
-# Drop TeamDepth table initially
-TeamDepth.objects.all().delete()
+# Rebuild the whole TeamDepth table. Set to False to only add the depths of
+# brackets that don't have any yet (e.g. after adding brackets).
+kRebuildAll = True
 
-first_fours = set(["Norfolk St", "App St", "Wichita St", "Drake", "Mt St Marys", "Texas Southern", "Michigan St", "UCLA"])
+# The depth of every team in every bracket: one plus the last round the bracket
+# has the team winning. First Four teams start at 0, everyone else at 1.
+def computeDepths(brackets):
+    teams = Team.objects.all()
+    first_fours = set()
+    for game in Game.objects.filter(gid__gt=63):
+        first_fours.add(game.team1_id)
+        first_fours.add(game.team2_id)
 
-teams = Team.objects.all()
-brackets = Bracket.objects.all()
-for team in teams:
-    print(team.name)
     # calculate initial depth
-    init_depth = 1
-    if team.name in first_fours:
-        init_depth = 0
-
+    depths = {} # (bracket id, team id) -> depth
     for bracket in brackets:
-        depth = init_depth
-        slots = Slot.objects.filter(bracket=bracket,winner=team)
-        for slot in slots:
-            game_rd = slot.game.get_round()
-            if depth < game_rd + 1:
-                depth = game_rd + 1
+        for team in teams:
+            init_depth = 1
+            if team.id in first_fours:
+                init_depth = 0
+            depths[(bracket.id, team.id)] = init_depth
+
+    # one pass over all the slots, joined with their games
+    slots = Slot.objects.filter(bracket__in=brackets).values_list('bracket_id', 'winner_id', 'game__gid')
+    for bracket_id, team_id, gid in slots:
+        game_rd = kGameInfo[gid].round
+        key = (bracket_id, team_id)
+        if depths[key] < game_rd + 1:
+            depths[key] = game_rd + 1
+    return depths
+
+if kRebuildAll:
+    brackets = list(Bracket.objects.all())
+else:
+    brackets = list(Bracket.objects.filter(teamdepth__isnull=True))
+print("Computing team depths for " + str(len(brackets)) + " brackets")
 
-        # create object, set depth
-        td = TeamDepth(team=team, bracket=bracket, depth=depth)
-        td.save()
+depths = computeDepths(brackets)
+with transaction.atomic():
+    if kRebuildAll:
+        # Drop TeamDepth table initially
+        TeamDepth.objects.all().delete()
+    TeamDepth.objects.bulk_create([TeamDepth(bracket_id=bracket_id, team_id=team_id, depth=depth) for (bracket_id, team_id), depth in depths.items()], batch_size=1000)
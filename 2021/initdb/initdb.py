@@ -1,4 +1,5 @@
-from bracketeering.models import Owner, Team, Bracket, Game, Slot
+from django.db import transaction
+from bracketeering.models import Owner, Team, Bracket, Game, Slot, kFirstFourGids
 
 #print(Owner.objects.all())
 
@@ -46,7 +47,7 @@ def loadGames():
             if h[gid][1] != 'None':
                 game.team2 = Team.get_by_name(h[gid][1])
         game.save()
-    for gid in range(65, 97, 8):
+    for gid in kFirstFourGids:
         team1 = Team.get_by_name(h[gid][0])
         team2 = Team.get_by_name(h[gid][1])
         game = Game(gid=gid, team1=team1, team2=team2)
@@ -79,9 +80,15 @@ def loadDraft():
 
 def loadBrackets():
     print("Loading Brackts...")
-    for bid in range(1, 29):
+    # Look everything up in memory, instead of 3 queries per slot
+    teams = {team.name: team for team in Team.objects.all()}
+    games = {game.gid: game for game in Game.objects.all()}
+    brackets = Bracket.objects.order_by('bid')
+
+    slots = []
+    for bracket in brackets:
         counts = [65, 32, 16, 8, 4, 2, 1]
-        path = 'initdb/data/brackets/csv/' + str(bid) + '.csv'
+        path = 'initdb/data/brackets/csv/' + str(bracket.bid) + '.csv'
         lines = open(path).read().split('\n')
         for i, line in enumerate(lines):
             if line == '':
@@ -102,12 +109,14 @@ def loadBrackets():
                     counts[0] += 8
 
                 # create Slot Entry
-                bracket = Bracket.get_by_bid(bid)
-                game = Game.get_by_gid(gid)
-                winner = Team.get_by_name(team_name)
-                slot = Slot(bracket=bracket, game=game, winner=winner)
-                slot.save()
-        print(str(bid) + "/28")
+                game = games[gid]
+                winner = teams[team_name.replace('-', ' ')]
+                slots.append(Slot(bracket=bracket, game=game, winner=winner))
+        print(str(bracket.bid) + "/" + str(len(brackets)))
+
+    # Insert all the slots at once
+    with transaction.atomic():
+        Slot.objects.bulk_create(slots, batch_size=1000)
 
 
 
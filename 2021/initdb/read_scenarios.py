@@ -1,59 +1,31 @@
-def summarize(scenarios, givens={}):
-    ret = {}
-    for s in scenarios:
-        # filter scenarios that dont match
-        for key in givens:
-            if s[key] != givens[key]:
-                break
-        else:
-            # store name
-            if s[9] not in ret:
-                ret[s[9]] = [0, 0]
-            if s[12] not in ret:
-                ret[s[12]] = [0, 0]
-    
-            # add the probability
-            ret[s[9]][0]+= s[7]
-            ret[s[12]][1] += s[7]
-    return ret
+from bracketeering.models import Scenario
+from bracketeering.scenarios import get_scenario_index, read_scenarios_csv, save_scenarios
 
-def print_summary(summary):
-    prob = 0
-    names = []
-    for name in summary:
-        names.append(name)
-        prob += summary[name][0]
-    names.sort()
-    for name in names:
-        if prob != 0:
-            sum2 = "%.2f" % (summary[name][0]/prob*100)
-            best = "%.2f" % (summary[name][1]/prob*100)
-            print(name, "- Sum2:", sum2, "- Best:", best)
+# Run run_scenarios.py first. (The scenarios are read from the Scenario table.)
+# If the table is empty, the archived 2021 run in initdb/scenarios.csv is loaded.
+# Also available from the command line:
+#    $ python manage.py scenarios 7=Houston 6=Baylor 4=Gonzaga --beats Michigan UCLA
 
+def print_summary(rows):
+    for name, sum2, best in rows:
+        print(name, "- Sum2:", "%.2f" % sum2, "- Best:", "%.2f" % best)
 
-lines = open('scenarios.csv').read().split('\n')
+if not Scenario.objects.exists():
+    save_scenarios(read_scenarios_csv('initdb/scenarios.csv'))
 
-scenarios = []
-for line in lines[1:]:
-    if line:
-        scenario = line.split(',')[:-1]
-        scenario[7] = float(scenario[7])
-        scenarios.append(scenario)
+index = get_scenario_index()
 
-
-
-fixed = {}
-fixed[0] = "Houston"
-fixed[1] = "Baylor"
-fixed[3] = "Gonzaga"
+fixed = {} # gid -> winner
+fixed[7] = "Houston"
+fixed[6] = "Baylor"
+fixed[4] = "Gonzaga"
 
 print("\nPREGAME:")
-print_summary(summarize(scenarios, fixed))
+print_summary(index.get_odds(fixed))
 
 print("\nIF MICHIGAN")
-fixed[2] = "Michigan"
-print_summary(summarize(scenarios, fixed))
+fixed[5] = "Michigan"
+print_summary(index.get_odds(fixed))
 print("\nIF UCLA")
-fixed[2] = "UCLA"
-print_summary(summarize(scenarios, fixed))
-
+fixed[5] = "UCLA"
+print_summary(index.get_odds(fixed))
@@ -113,6 +113,20 @@ else:
 #}
 # [END db_setup]
 
+# Cache
+# https://docs.djangoproject.com/en/3.1/topics/cache/
+#
+# The database cache is shared by every App Engine instance (and by the shell
+# where results are entered). Create the table once with:
+#    $ python manage.py createcachetable
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'bracketeering_cache',
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
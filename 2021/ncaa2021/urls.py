@@ -10,5 +10,9 @@ urlpatterns = [
     path('team/<str:name>/', TeamView.as_view(), name='team'),
     path('about/', AboutView.as_view(), name='about'),
     path('draft/', DraftView.as_view(), name='draft'),
+    path('scenarios/', ScenarioView.as_view(), name='scenarios'),
+    path('whatif/', WhatIfView.as_view(), name='whatif'),
+    path('status/', StatusView.as_view(), name='status'),
+    path('state/', StateView.as_view(), name='state'),
     path('', MainView.as_view(), name='main'),
 ]
@@ -0,0 +1,98 @@
+# A compact encoding of a bracket: one bitmask per round.
+#
+# Bit `t` of rounds[r] is set if the bracket picks the team with overall seed `t`
+# to win its game in round r. A team can only play in one game per round, so the
+# set of winners in a round says who wins every game of that round.
+#
+# That makes scoring cheap. The correct picks in a round are `b & truth`, and a
+# bonus group is earned if `b & mask == truth & mask`, where `mask` holds the teams
+# that could play in the group's games.
+
+from models import Bracket, Slot, kPointsPerRound, kGameRound, kGameBonus, kNumBonuses
+
+def popcount(x: int) -> int:
+    return bin(x).count("1")
+
+# int.bit_count() is much faster, but needs Python 3.10
+if hasattr(int, "bit_count"):
+    popcount = int.bit_count
+
+class BitBracket(object):
+    def __init__(self, bid: int = 0):
+        self.bid = bid
+        self.rounds = [0] * 7
+
+    @staticmethod
+    def fromBracket(bracket: Bracket):
+        b = BitBracket(bracket.bid)
+        for slot in bracket.slots:
+            b.rounds[slot.game.round] |= 1 << slot.winner.overall_seed
+        return b
+
+    # Read a bracket written by `Bracket.writeToFile`, without creating any `Slot`s.
+    @staticmethod
+    def readFromFile(teams_lookup, path: str):
+        b = BitBracket()
+        lines = open(path).read().split('\n')
+        b.bid = int(lines[0])
+        for line in lines[1:]:
+            [gid, team_name] = line.split(',')
+            b.rounds[kGameRound[int(gid)]] |= 1 << teams_lookup[team_name].overall_seed
+        return b
+
+# The team dependent part of the encoding. Build one per tournament, after loadGames().
+class BitLayout(object):
+    def __init__(self, teams):
+        self.teams = {}
+        # team_gids[overall_seed][round] = the game the team plays in that round (or None)
+        self.team_gids = {}
+        for team in teams:
+            self.teams[team.overall_seed] = team
+            gid = team.first_game.gid
+            gids = [None] * 7
+            for round in range(kGameRound[gid], 7):
+                gids[round] = gid >> (round - kGameRound[gid])
+            self.team_gids[team.overall_seed] = gids
+
+        # The (round, mask) of each bonus group
+        self.bonus_masks = [None] * kNumBonuses
+        for seed, gids in self.team_gids.items():
+            for round, gid in enumerate(gids):
+                if gid is None or kGameBonus[gid] is None:
+                    continue
+                bonus = kGameBonus[gid]
+                if self.bonus_masks[bonus] is None:
+                    self.bonus_masks[bonus] = [round, 0]
+                self.bonus_masks[bonus][1] |= 1 << seed
+
+    # Convert back to a `Bracket`, with slots in the usual order.
+    def toBracket(self, b: BitBracket, games):
+        bracket = Bracket(b.bid)
+        picks = []
+        for round, mask in enumerate(b.rounds):
+            seed = 0
+            while mask:
+                if mask & 1:
+                    picks.append((self.team_gids[seed][round], self.teams[seed]))
+                mask >>= 1
+                seed += 1
+        picks.sort(key=lambda pick: pick[0])
+        for gid, team in picks:
+            bracket.slots.append(Slot(bracket, team, games[gid]))
+        return bracket
+
+    # Returns total points, like bracketCompare.
+    def compare(self, b1: BitBracket, b2: BitBracket):
+        r1 = b1.rounds
+        r2 = b2.rounds
+        points = 0
+        for round, round_points in enumerate(kPointsPerRound):
+            points += round_points * popcount(r1[round] & r2[round])
+        for round, mask in self.bonus_masks:
+            if r1[round] & mask == r2[round] & mask:
+                points += 5
+        return points
+
+    # The number of Elite Eight teams the brackets have in common. (The winners of games [8, 16))
+    def eliteEight(self, b1: BitBracket, b2: BitBracket):
+        return popcount(b1.rounds[3] & b2.rounds[3])
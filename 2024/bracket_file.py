@@ -0,0 +1,151 @@
+# A compact binary file of brackets, for when there are far too many to keep a
+# text file (or a `Bracket`) for each one. e.g. the candidates for the draft.
+#
+# Requires numpy.
+#
+# The layout:
+#   - "BRKT", the format version, the number of slots and the number of teams.
+#     (One byte each, after the magic.)
+#   - The Game ID of each slot, one byte each, in `Bracket.slots` order.
+#   - The team table: each team's name (one length byte, then UTF-8), in
+#     overall seed order. A team's id is its position in the table, which is
+#     `overall_seed - 1`, same as vector_mc.teamId().
+#   - Then one record per bracket: the team id picked in each slot. That is 67
+#     bytes per bracket, and nothing else. The bracket at index i has bid i + 1.
+#
+# Since the records are exactly the rows of `Tournament.encodeBrackets`, a file
+# can be memory mapped and scored by vector_mc without decoding anything.
+
+import os
+import numpy as np
+
+from models import Bracket, Slot
+
+kMagic = b"BRKT"
+kFormatVersion = 1
+
+# Brackets are read and written this many at a time when streaming.
+kRecordChunk = 1 << 14
+
+class BracketWriter(object):
+    # teams are in overall seed order. slot_gids = `Tournament.slot_gids`.
+    def __init__(self, path: str, teams, slot_gids):
+        self.slot_gids = list(slot_gids)
+        self.team_ids = {team.name: i for i, team in enumerate(teams)}
+        self.count = 0
+        self.file = open(path, "wb")
+        header = bytearray(kMagic)
+        header += bytes([kFormatVersion, len(self.slot_gids), len(teams)])
+        header += bytes(self.slot_gids)
+        for team in teams:
+            name = team.name.encode("utf-8")
+            header += bytes([len(name)]) + name
+        self.file.write(header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    # Append one `Bracket`. Its slots must be in the usual order.
+    def write(self, bracket: Bracket):
+        self.writePicks(np.array([[self.team_ids[slot.winner.name] for slot in bracket.slots]], dtype=np.uint8))
+
+    # Append a (brackets x slots) matrix of team ids. (e.g. from `Tournament.encodeBrackets`)
+    def writePicks(self, picks):
+        picks = np.asarray(picks, dtype=np.uint8)
+        if picks.ndim != 2 or picks.shape[1] != len(self.slot_gids):
+            raise ValueError("Expected %s picks per bracket, got shape %s" % (len(self.slot_gids), picks.shape))
+        self.file.write(np.ascontiguousarray(picks).tobytes())
+        self.count += picks.shape[0]
+
+class BracketReader(object):
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            head = file.read(len(kMagic) + 3)
+            if head[:len(kMagic)] != kMagic:
+                raise ValueError("%s is not a bracket file" % path)
+            version, num_slots, num_teams = head[len(kMagic):]
+            if version != kFormatVersion:
+                raise ValueError("%s has format version %s, expected %s" % (path, version, kFormatVersion))
+            self.slot_gids = list(file.read(num_slots))
+            self.team_names = []
+            for _ in range(num_teams):
+                length = file.read(1)[0]
+                self.team_names.append(file.read(length).decode("utf-8"))
+            self.offset = file.tell()
+        self.record_size = num_slots
+        self.picks = None
+        self.count = (os.path.getsize(path) - self.offset) // self.record_size
+
+    def __len__(self):
+        return self.count
+
+    # A read-only (brackets x slots) view of every record, memory mapped, so
+    # indexing and slicing only reads what they touch.
+    def mmap(self):
+        if self.picks is None:
+            if self.count == 0:
+                self.picks = np.zeros((0, self.record_size), dtype=np.uint8)
+            else:
+                self.picks = np.memmap(self.path, dtype=np.uint8, mode="r", offset=self.offset, shape=(self.count, self.record_size))
+        return self.picks
+
+    # The team ids picked by bracket i (0-indexed).
+    def __getitem__(self, i):
+        return self.mmap()[i]
+
+    # Stream the records in chunks of (at most) `chunk` brackets, without
+    # mapping the whole file. Yields (first index, picks) pairs.
+    def chunks(self, chunk: int = kRecordChunk):
+        with open(self.path, "rb") as file:
+            file.seek(self.offset)
+            start = 0
+            while start < self.count:
+                n = min(chunk, self.count - start)
+                data = file.read(n * self.record_size)
+                yield start, np.frombuffer(data, dtype=np.uint8).reshape(n, self.record_size)
+                start += n
+
+    # Check the file against the loaded teams and games, before mixing its
+    # team ids with theirs.
+    def checkTeams(self, teams, slot_gids):
+        if [team.name for team in teams] != self.team_names:
+            raise ValueError("%s was written for a different set of teams" % self.path)
+        if list(slot_gids) != self.slot_gids:
+            raise ValueError("%s was written for a different set of games" % self.path)
+
+    # Decode bracket i into a `Bracket`.
+    def bracket(self, i: int, teams_lookup, games):
+        bracket = Bracket(i + 1)
+        for gid, team_id in zip(self.slot_gids, self[i]):
+            bracket.slots.append(Slot(bracket, teams_lookup[self.team_names[team_id]], games[gid]))
+        return bracket
+
+# ======== Conversions to and from the .txt format ============
+
+# Write the brackets (e.g. from `Bracket.readFromFile`) to one binary file.
+# The bids must be 1, 2, 3, ... in order, since the file does not store them.
+def writeBracketFile(path: str, brackets, teams, slot_gids):
+    with BracketWriter(path, teams, slot_gids) as writer:
+        for i, bracket in enumerate(brackets):
+            if bracket.bid != i + 1:
+                raise ValueError("Bracket %s is at index %s" % (bracket.bid, i))
+            writer.write(bracket)
+
+# data/brackets/1.txt, 2.txt, ... -> one binary file
+def textToBinary(text_dir: str, count: int, path: str, teams, teams_lookup, games, slot_gids):
+    with BracketWriter(path, teams, slot_gids) as writer:
+        for bid in range(1, count + 1):
+            writer.write(Bracket.readFromFile(teams_lookup, games, os.path.join(text_dir, "%s.txt" % bid)))
+
+# One binary file -> text_dir/1.txt, 2.txt, ... (the format `Bracket.writeToFile` uses)
+def binaryToText(path: str, text_dir: str, teams_lookup, games):
+    reader = BracketReader(path)
+    for i in range(len(reader)):
+        reader.bracket(i, teams_lookup, games).writeToFile(os.path.join(text_dir, "%s.txt" % (i + 1)))
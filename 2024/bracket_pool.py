@@ -0,0 +1,118 @@
+# Generate a large pool of candidate brackets, and pick the ones to draft from.
+#
+# Instead of calling generateBracket() once per bracket, candidates are drawn a
+# chunk at a time with vector_mc.simulate(), which plays every game of every
+# candidate at once with the same Elo probabilities as prob538Compare(). Each
+# chunk is scored (see metrics.py) and streamed to a bracket file (see
+# bracket_file.py), so memory only depends on the chunk size. Only the scores,
+# a few floats per candidate, are kept.
+#
+# selectPool() then filters and sorts the candidates by their scores, and picks
+# them greedily, skipping any that are too much like the ones already picked.
+# If that leaves too few, the overlap limit is relaxed a step at a time.
+#
+# Requires numpy.
+
+import numpy as np
+
+from models import kGamePoints
+from vector_mc import Tournament, kChunkSize, simulate
+from bracket_file import BracketReader, BracketWriter
+from metrics import BracketMetrics
+
+# Two picked brackets can have at most this fraction of their points (without
+# bonuses) in common.
+kMaxOverlap = .7
+
+# If fewer than `count` brackets pass, the limit goes up by this much, until
+# kMaxRelaxedOverlap. The brackets already picked are kept.
+kOverlapStep = .05
+kMaxRelaxedOverlap = .9
+
+# Only the best this many candidates (after filtering) are considered for the
+# greedy selection. The best few percent of a big pool are nearly all close to
+# chalk, so this has to reach further down than the number of brackets needed.
+kMaxCandidates = 200000
+
+class BracketPool(object):
+    def __init__(self, reader: BracketReader, scores):
+        self.reader = reader
+        self.scores = scores # {score name: array, one score per candidate}
+
+    def __len__(self):
+        return len(self.reader)
+
+    # Decode candidate i into a `Bracket` with the given bid.
+    def bracket(self, i: int, teams_lookup, games, bid: int):
+        bracket = self.reader.bracket(i, teams_lookup, games)
+        bracket.bid = bid
+        return bracket
+
+# Draw `n` candidates into the bracket file at `path`.
+#
+# (This is meant for before the tournament. Any known results are kept, like
+# truthPlus538Compare does.)
+def generatePool(path: str, n: int, tour: Tournament, chalk, streak_gids, seed=None):
+    metrics = BracketMetrics(tour, chalk, streak_gids)
+    rng = np.random.default_rng(seed)
+    scores = {name: np.empty(n) for name in metrics.metrics}
+    with BracketWriter(path, tour.teams, tour.slot_gids) as writer:
+        for start in range(0, n, kChunkSize):
+            picks = simulate(tour, min(kChunkSize, n - start), rng)[tour.slot_gids].T
+            writer.writePicks(picks)
+            for name, values in metrics.score(picks).items():
+                scores[name][start:start + len(values)] = values
+    return BracketPool(BracketReader(path), scores)
+
+# Score the candidates in an existing bracket file.
+def loadPool(path: str, tour: Tournament, chalk, streak_gids):
+    reader = BracketReader(path)
+    reader.checkTeams(tour.teams, tour.slot_gids)
+    metrics = BracketMetrics(tour, chalk, streak_gids)
+    scores = {name: np.empty(len(reader)) for name in metrics.metrics}
+    for start, picks in reader.chunks():
+        for name, values in metrics.score(picks).items():
+            scores[name][start:start + len(values)] = values
+    return BracketPool(reader, scores)
+
+# Pick `count` candidates. Returns their indexes into the pool, or raises
+# ValueError if there aren't enough, even with the overlap limit relaxed.
+#
+# sort_by        = the metric to prefer, highest first. (See BracketMetrics)
+# min_scores     = {score name: minimum} drops every candidate below a minimum.
+# max_overlap    = see kMaxOverlap.
+# max_per_winner = the most picked brackets with the same champion. (None = no limit)
+def selectPool(pool: BracketPool, count: int, sort_by="538", min_scores={}, max_overlap=kMaxOverlap, max_per_winner=None):
+    keep = np.ones(len(pool), dtype=bool)
+    for name, minimum in min_scores.items():
+        keep &= pool.scores[name] >= minimum
+    candidates = np.flatnonzero(keep)
+    order = np.argsort(-pool.scores[sort_by][candidates], kind="stable")
+    candidates = np.sort(candidates[order[:kMaxCandidates]])
+
+    # Read the candidates in file order, then go through them best first
+    picks = np.asarray(pool.reader.mmap()[candidates])
+    ranked = np.argsort(-pool.scores[sort_by][candidates], kind="stable")
+
+    points = np.array([kGamePoints[gid] for gid in pool.reader.slot_gids])
+    selected = []
+    winners = {}
+    while True:
+        max_common = max_overlap * points.sum()
+        for row in ranked:
+            if len(selected) == count:
+                break
+            if row in selected:
+                continue
+            winner = picks[row, 0] # Slot 0 is the championship
+            if max_per_winner is not None and winners.get(winner, 0) >= max_per_winner:
+                continue
+            if selected and ((picks[selected] == picks[row]) * points).sum(axis=1).max() > max_common:
+                continue
+            selected.append(row)
+            winners[winner] = winners.get(winner, 0) + 1
+        if len(selected) == count:
+            return [int(candidates[row]) for row in selected]
+        if max_overlap >= kMaxRelaxedOverlap:
+            raise ValueError("Only %s of %s brackets could be picked, even with %.0f%% of their points in common" % (len(selected), count, 100 * max_overlap))
+        max_overlap = min(max_overlap + kOverlapStep, kMaxRelaxedOverlap)
@@ -0,0 +1,175 @@
+# The best next pick during the (snake) draft.
+#
+# The tournaments are simulated and every bracket is scored against them once,
+# up front. The scores are saved to a file (see DraftSims), so running this again
+# after every pick only re-reads them. Evaluating a draft is then just grouping
+# the score rows by owner and paying out the prizes, the same way vector_mc does.
+#
+# For each bracket the picking owner could take, the rest of the draft is played
+# out: everyone after them takes the best bracket left, by its pre-draft value
+# (see draft_value.py, computed from the same simulations). The picking owner's
+# own later picks can instead be searched, `lookahead` picks deep. Each finished
+# draft is scored by the picking owner's expected share of the prizes.
+#
+# Requires numpy.
+
+import os
+import numpy as np
+
+from vector_mc import Tournament, kChunkSize, simulate, scoreBrackets, ownerScores, prizeWinners, eliteEightScores
+from draft_value import creditValues, kPrizeNames
+
+# The number of simulated tournaments the picks are evaluated on
+kDraftSims = 1 << 16
+
+# The most hands DraftSims keeps the scores of (about 0.5MB each)
+kMaxCachedHands = 256
+
+# How much each prize is worth, in the order of kPrizeNames
+kPrizeWeights = [1.0, 1.0, 1.0]
+
+# The simulated scores of every bracket. Saved to `path`, and reused as long as
+# the brackets, the number of simulations, the win probabilities (the ratings),
+# the known results and the seed (if one is given) have not changed.
+class DraftSims(object):
+    def __init__(self, brackets, tour: Tournament, path: str = None, n: int = kDraftSims, seed=None):
+        self.bids = [b.bid for b in brackets]
+        self.hand_cache = {}
+        inputs = {
+            "picks": tour.encodeBrackets(brackets),
+            "p": tour.p,
+            "truth": np.array([tour.truth().get(gid, -1) for gid in range(128)]),
+            "n": np.array(n),
+        }
+        if path and os.path.exists(path):
+            saved = np.load(path)
+            if all(name in saved and np.array_equal(saved[name], value) for name, value in inputs.items()) \
+                    and (seed is None or np.array_equal(saved["seed"], np.array(seed))):
+                self.scores = saved["scores"]
+                self.elite_eight = saved["elite_eight"]
+                return
+
+        rng = np.random.default_rng(seed)
+        self.scores = np.empty((len(brackets), n), dtype=np.int16)
+        self.elite_eight = np.empty((len(brackets), n), dtype=np.int8)
+        for start in range(0, n, kChunkSize):
+            winners = simulate(tour, min(kChunkSize, n - start), rng)
+            scores, elite_eight = scoreBrackets(tour, inputs["picks"], winners)
+            self.scores[:, start:start + scores.shape[1]] = scores
+            self.elite_eight[:, start:start + scores.shape[1]] = elite_eight
+        if path:
+            # (np.savez adds the extension, unless it is already there. An
+            # unseeded run is saved with an empty seed.)
+            np.savez(path, scores=self.scores, elite_eight=self.elite_eight, seed=np.array([] if seed is None else seed), **inputs)
+
+    # The [sum of 2, best bracket, elite eight] scores of one hand (see
+    # vector_mc.ownerScores and eliteEightScores), in every simulation. Most of
+    # the drafts that get played out share most of their hands, so these are
+    # cached.
+    def handScores(self, hand):
+        key = tuple(sorted(hand))
+        if key not in self.hand_cache:
+            if len(self.hand_cache) >= kMaxCachedHands:
+                self.hand_cache.clear()
+            owner_cols = np.array([key])
+            sum_2, single = ownerScores(self.scores, owner_cols)
+            # (the elite eight keys fit in 32 bits, for up to 9 brackets per owner)
+            elite_eight = eliteEightScores(self.elite_eight, owner_cols).astype(np.int32)
+            self.hand_cache[key] = [sum_2[0], single[0], elite_eight[0]]
+        return self.hand_cache[key]
+
+    # The expected [sum of 2, best, elite eight] share of each owner, given
+    # hands[owner] = [bracket index, ...].
+    def payouts(self, hands):
+        scores = [self.handScores(hand) for hand in hands]
+        shares = []
+        for prize in range(3):
+            won = prizeWinners(np.stack([score[prize] for score in scores]))
+            shares.append((won / won.sum(axis=0)).mean(axis=1))
+        return np.stack(shares, axis=1)
+
+    # The pre-draft value of each bracket (see draft_value.py), weighted by prize
+    def values(self, num_owners: int, seed=None):
+        rng = np.random.default_rng(seed)
+        total = np.zeros((3, len(self.bids)))
+        n = self.scores.shape[1]
+        for start in range(0, n, kChunkSize):
+            stop = min(start + kChunkSize, n)
+            total += creditValues(self.scores[:, start:stop], self.elite_eight[:, start:stop], num_owners, rng).sum(axis=2)
+        return np.dot(kPrizeWeights, total / n)
+
+# The owner making pick k (0-indexed) of a snake draft
+def snakeOwner(order, k: int):
+    round, i = divmod(k, len(order))
+    if round % 2 == 1:
+        i = len(order) - 1 - i
+    return order[i]
+
+class DraftAssistant(object):
+    # order = the owners, in the order they pick in the first round. Every
+    # bracket gets drafted, so there must be brackets_per_owner for each owner.
+    def __init__(self, sims: DraftSims, order, brackets_per_owner: int, seed=None):
+        self.sims = sims
+        self.order = list(order)
+        self.num_picks = len(self.order) * brackets_per_owner
+        if self.num_picks != len(sims.bids):
+            raise ValueError("%s owners can't each draft %s of %s brackets" % (len(self.order), brackets_per_owner, len(sims.bids)))
+        self.index = {bid: i for i, bid in enumerate(sims.bids)}
+        # The likely picks, best first
+        values = sims.values(len(self.order), seed)
+        self.ranking = [int(i) for i in np.argsort(-values, kind="stable")]
+
+    # draft = [[owner, bid], ...] in pick order, like loadDraft reads
+    def hands(self, draft):
+        hands = {owner: [] for owner in self.order}
+        for k, (owner, bid) in enumerate(draft):
+            if owner != snakeOwner(self.order, k):
+                raise ValueError("Pick %s should be %s's, not %s's" % (k + 1, snakeOwner(self.order, k), owner))
+            hands[owner].append(self.index[bid])
+        return hands
+
+    # Play out the rest of the draft, with everyone taking the best bracket left.
+    # Returns the picking owner's weighted expected payout, and the shares.
+    def rollout(self, hands, taken, k: int, owner, lookahead: int):
+        hands = {o: list(h) for o, h in hands.items()}
+        taken = set(taken)
+        while k < self.num_picks:
+            picker = snakeOwner(self.order, k)
+            if picker == owner and lookahead > 0:
+                return self.best(hands, taken, k, owner, lookahead)[0][1:]
+            for i in self.ranking:
+                if i not in taken:
+                    break
+            hands[picker].append(i)
+            taken.add(i)
+            k += 1
+        shares = self.sims.payouts([hands[o] for o in self.order])[self.order.index(owner)]
+        return float(np.dot(kPrizeWeights, shares)), shares
+
+    # Every bracket `owner` could take with pick k, best first:
+    # [[bracket index, weighted payout, shares], ...]
+    def best(self, hands, taken, k: int, owner, lookahead: int):
+        options = []
+        for i in range(len(self.sims.bids)):
+            if i in taken:
+                continue
+            hands[owner].append(i)
+            taken.add(i)
+            payout, shares = self.rollout(hands, taken, k + 1, owner, lookahead - 1)
+            hands[owner].pop()
+            taken.discard(i)
+            options.append([i, payout, shares])
+        options.sort(key=lambda option: -option[1])
+        return options
+
+    # The options for the next pick, given the picks so far.
+    # Returns [[bid, weighted payout, {prize name: share}], ...], best first.
+    def suggest(self, draft, lookahead: int = 1):
+        k = len(draft)
+        if k >= self.num_picks:
+            raise ValueError("The draft is over")
+        hands = self.hands(draft)
+        taken = set(i for hand in hands.values() for i in hand)
+        owner = snakeOwner(self.order, k)
+        options = self.best(hands, taken, k, owner, lookahead)
+        return [[self.sims.bids[i], payout, dict(zip(kPrizeNames, shares.tolist()))] for i, payout, shares in options]
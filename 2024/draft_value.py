@@ -0,0 +1,116 @@
+# What each bracket is worth before the draft: its expected share of the sum of
+# 2, best bracket and elite eight prizes.
+#
+# The best bracket prize does not depend on who owns what. The other two do, so
+# every simulation also draws a draft: the brackets are split into `num_owners`
+# hands of equal size, uniformly at random. (Before the draft nothing is known
+# about how the other owners pick, so every hand the snake draft can produce is
+# taken to be as likely as any other.) A prize won by an owner is credited to
+# the brackets that won it:
+#   - sum of 2:    half to each of the owner's 2 best brackets.
+#   - best:        to the best bracket.
+#   - elite eight: to the owner's bracket with the most Elite Eight teams.
+# Ties split the prize, as usual. So the values of all the brackets add up to 1
+# for each prize.
+#
+# Simulations are run in rounds (sharded like parallel_mc.py) until every value
+# is known to within `tolerance` (the half width of a 95% confidence interval),
+# instead of for a fixed count. Each round doubles the simulations so far, so
+# this runs at most twice as many as needed, and the later rounds have enough
+# shards to keep every worker busy.
+#
+# Requires numpy.
+
+import numpy as np
+
+from vector_mc import Tournament, kChunkSize, simulate, scoreBrackets, prizeWinners, eliteEightKeys
+from parallel_mc import kShardSize, runShards, worker_state
+
+kPrizeNames = ["sum of 2", "best", "elite eight"]
+
+# Stop once every value is within this much (of a whole prize) of the truth...
+kValueTolerance = .001
+# ... or after this many simulations.
+kMaxValueSims = 1 << 23
+
+# z for a 95% confidence interval
+kConfidenceZ = 1.96
+
+# Returns a (prizes x brackets x n) matrix of the share of each prize credited
+# to each bracket, in each of `n` simulations.
+def bracketValues(tour: Tournament, picks, num_owners: int, n: int, rng):
+    winners = simulate(tour, n, rng)
+    scores, elite_eight = scoreBrackets(tour, picks, winners)
+    return creditValues(scores, elite_eight, num_owners, rng)
+
+# Same, given the (brackets x n) scores and Elite Eight counts of already
+# simulated tournaments. Only the drafts are drawn from `rng`.
+def creditValues(scores, elite_eight, num_owners: int, rng):
+    num_brackets, n = scores.shape
+    sims = np.arange(n)
+    values = np.zeros((3, num_brackets, n))
+
+    # Best bracket
+    best = prizeWinners(scores)
+    values[1] = best / best.sum(axis=0)
+
+    # A random draft per simulation: hands[owner, i, sim] = the owner's ith bracket
+    hands = np.argsort(rng.random((num_brackets, n)), axis=0).reshape(num_owners, num_brackets // num_owners, n)
+
+    # Sum of 2
+    owner_scores = scores[hands, sims]
+    order = np.argsort(owner_scores, axis=1)[:, -2:]
+    top_2 = np.take_along_axis(hands, order, axis=1)
+    sum_2 = np.take_along_axis(owner_scores, order, axis=1).sum(axis=1)
+    won = prizeWinners(sum_2)
+    share = won / won.sum(axis=0)
+    # (every bracket is in exactly one hand, so the indices don't repeat)
+    values[0][top_2[:, 0], sims] = share / 2
+    values[0][top_2[:, 1], sims] = share / 2
+
+    # Elite eight
+    owner_ee = elite_eight[hands, sims]
+    won = prizeWinners(eliteEightKeys(np.sort(owner_ee, axis=1)))
+    top = np.take_along_axis(hands, np.argmax(owner_ee, axis=1)[:, None], axis=1)[:, 0]
+    values[2][top, sims] = won / won.sum(axis=0)
+    return values
+
+def valueShard(shard):
+    seed, n = shard
+    s = worker_state
+    rng = np.random.default_rng(seed)
+    totals = np.zeros((2, 3, s["picks"].shape[0])) # [sum, sum of squares]
+    for start in range(0, n, kChunkSize):
+        values = bracketValues(s["tour"], s["picks"], s["num_owners"], min(kChunkSize, n - start), rng)
+        totals[0] += values.sum(axis=2)
+        totals[1] += (values * values).sum(axis=2)
+    return totals
+
+# Returns [{bid: [sum of 2, best, elite eight] expected shares}, {bid: [95% CI half widths]}, simulations run]
+def preDraftValues(brackets, tour: Tournament, num_owners: int, seed=None, tolerance=kValueTolerance, max_sims=kMaxValueSims, workers=None):
+    if len(brackets) % num_owners:
+        raise ValueError("%s brackets can't be split between %s owners" % (len(brackets), num_owners))
+    state = {
+        "tour": tour,
+        "picks": tour.encodeBrackets(brackets),
+        "num_owners": num_owners,
+    }
+    # Round i is seeded from [entropy, i], so a seed gives the same values for
+    # any number of workers.
+    entropy = np.random.SeedSequence(seed).entropy
+    totals = np.zeros((2, 3, len(brackets)))
+    n = 0
+    round = 0
+    while n < max_sims:
+        sims = min(max(n, kShardSize), max_sims - n)
+        totals += runShards(valueShard, sims, [entropy, round], state, workers)
+        n += sims
+        round += 1
+        mean = totals[0] / n
+        var = np.maximum(totals[1] / n - mean * mean, 0.0)
+        half_width = kConfidenceZ * np.sqrt(var / n)
+        if half_width.max() <= tolerance:
+            break
+
+    bids = [b.bid for b in brackets]
+    return [dict(zip(bids, mean.T.tolist())), dict(zip(bids, half_width.T.tolist())), n]
@@ -0,0 +1,164 @@
+# Exact payout odds, for late in the tournament.
+#
+# Instead of sampling, walk the remaining games bottom-up. Each subtree of the
+# bracket is summarized by its distribution of "states": who won the subtree,
+# and for every drafted bracket, the points (and Elite Eight count) it has
+# earned so far, plus which of its still open bonus groups it has missed.
+# Two children are combined with every pair of their states, for both possible
+# winners, using the Elo win probabilities. States that are identical are merged
+# (their probabilities added). At the championship, the states are grouped by
+# score vector and each group is paid out once.
+#
+# The number of states grows quickly with the number of undecided games, so
+# payoutOdds() only solves exactly when few enough games are left, and falls
+# back to sampling otherwise.
+#
+# Requires numpy.
+
+import numpy as np
+
+from models import kGamePoints, kGameRound, kGameBonus
+from vector_mc import Tournament, ownerColumns, ownerScores, eliteEightScores, prizeWinners
+from parallel_mc import parallelMC
+
+# Solve exactly when at most this many games are undecided. (15 = Sweet 16 onward)
+kMaxExactGames = 15
+
+# closing[gid] = the bonus groups that are complete once game `gid` is played.
+# (The lowest common ancestor of all the games in the group.)
+def closingGames():
+    gids = {}
+    for gid in range(1, 128):
+        if kGameBonus[gid] is not None:
+            gids.setdefault(kGameBonus[gid], []).append(gid)
+    closing = {}
+    for bonus, group in gids.items():
+        lo, hi = min(group), max(group)
+        while lo != hi:
+            lo //= 2
+            hi //= 2
+        closing.setdefault(lo, []).append(bonus)
+    return closing
+
+kClosingGames = closingGames()
+
+# A distribution over the states of a subtree. Row i has probability p[i].
+class States(object):
+    def __init__(self, winner, p, points, elite_eight, missed):
+        self.winner = winner
+        self.p = p
+        self.points = points
+        self.elite_eight = elite_eight
+        self.missed = missed
+
+    @staticmethod
+    def team(tid: int, num_brackets: int):
+        zeros = np.zeros((1, num_brackets), dtype=np.int64)
+        return States(np.array([tid]), np.ones(1), zeros, zeros, zeros)
+
+    # Merge identical states.
+    def merge(self):
+        key = np.column_stack([self.winner, self.points, self.elite_eight, self.missed])
+        key, inverse = np.unique(key, axis=0, return_inverse=True)
+        nb = self.points.shape[1]
+        p = np.bincount(inverse.ravel(), weights=self.p)
+        return States(key[:, 0], p, key[:, 1:1 + nb], key[:, 1 + nb:1 + 2 * nb], key[:, 1 + 2 * nb:])
+
+# The number of games without a winner (known or forced).
+def undecidedGames(tour: Tournament, team1_wins={}):
+    truth = tour.truth()
+    return len([gid for gid in tour.sim_gids if gid not in truth and gid not in team1_wins])
+
+# The exact [sum of 2, best bracket, elite eight] payout odds of every owner, as
+# fractions of each prize. Same precedence as simulate(): forced outcomes, then
+# the known results, then the Elo ratings.
+def exactPayouts(tour: Tournament, owners, team1_wins={}):
+    brackets = [b for owner in owners.values() for b in owner.brackets]
+    picks = tour.encodeBrackets(brackets).astype(np.int64)
+    owner_cols = ownerColumns(owners, brackets)
+    slots = {gid: i for i, gid in enumerate(tour.slot_gids)}
+    truth = tour.truth()
+    num_teams = len(tour.teams)
+    nb = len(brackets)
+
+    def solve(gid):
+        if gid in tour.play_in:
+            left = States.team(tour.play_in[gid][0], nb)
+            right = States.team(tour.play_in[gid][1], nb)
+        else:
+            left = subtree(2 * gid)
+            right = subtree(2 * gid + 1)
+
+        # Every pair of states
+        i = np.repeat(np.arange(len(left.p)), len(right.p))
+        j = np.tile(np.arange(len(right.p)), len(left.p))
+        t1 = left.winner[i]
+        t2 = right.winner[j]
+        p = left.p[i] * right.p[j]
+        points = left.points[i] + right.points[j]
+        elite_eight = left.elite_eight[i] + right.elite_eight[j]
+        missed = left.missed[i] | right.missed[j]
+
+        # Both possible winners
+        if gid in team1_wins:
+            p1_wins = np.full(len(p), 1.0 if team1_wins[gid] else 0.0)
+        elif gid in truth:
+            p1_wins = (t1 == truth[gid]).astype(float)
+        else:
+            p1_wins = tour.p[t1 * num_teams + t2]
+        winner = np.concatenate([t1, t2])
+        p = np.concatenate([p * p1_wins, p * (1.0 - p1_wins)])
+        points = np.concatenate([points, points])
+        elite_eight = np.concatenate([elite_eight, elite_eight])
+        missed = np.concatenate([missed, missed])
+        keep = p > 0
+        winner, p, points, elite_eight, missed = winner[keep], p[keep], points[keep], elite_eight[keep], missed[keep]
+
+        # Score this game
+        hits = picks[None, :, slots[gid]] == winner[:, None]
+        points = points + hits * kGamePoints[gid]
+        if kGameBonus[gid] is not None:
+            missed = missed | np.where(hits, 0, 1 << kGameBonus[gid])
+        if kGameRound[gid] == 3:
+            elite_eight = elite_eight + hits
+
+        # Pay out the bonus groups that are now complete
+        for bonus in kClosingGames.get(gid, []):
+            bit = 1 << bonus
+            points = points + 5 * ((missed & bit) == 0)
+            missed = missed & ~bit
+
+        return States(winner, p, points, elite_eight, missed).merge()
+
+    def subtree(position):
+        if position >= 64 and position not in tour.play_in:
+            return States.team(int(tour.leaves[position]), nb)
+        return solve(position)
+
+    final = solve(1)
+
+    # Group the outcomes by score vector (the winner no longer matters)
+    key = np.column_stack([final.points, final.elite_eight])
+    key, inverse = np.unique(key, axis=0, return_inverse=True)
+    p = np.bincount(inverse.ravel(), weights=final.p)
+    scores = key[:, :nb].T
+    elite_eight = key[:, nb:].T
+
+    sum_2, single = ownerScores(scores, owner_cols)
+    payouts = []
+    for values in [sum_2, single, eliteEightScores(elite_eight, owner_cols)]:
+        winners = prizeWinners(values)
+        payouts.append((winners / winners.sum(axis=0) * p).sum(axis=1))
+
+    names = list(owners.keys())
+    return [dict(zip(names, payout.tolist())) for payout in payouts]
+
+# Payout odds, as fractions of each prize. Exact when possible, otherwise from
+# `n` simulations (see parallelMC).
+#
+# Returns [[owner_sum_2_odds, owner_single_odds, owner_elite_eight_odds], is_exact]
+def payoutOdds(n: int, owners, tour: Tournament, seed=None, team1_wins={}, fixed_winners=[], workers=None):
+    if not fixed_winners and undecidedGames(tour, team1_wins) <= kMaxExactGames:
+        return [exactPayouts(tour, owners, team1_wins), True]
+    sims = parallelMC(n, owners, tour, seed, team1_wins, fixed_winners, workers)
+    return [[{o: v / n for o, v in h.items()} for h in sims], False]
@@ -0,0 +1,115 @@
+# Enumerates every outcome of the remaining games, depth first.
+#
+# The old exhaustive sims regenerated all 67 games and rescored every bracket
+# from scratch for each of the 2^k scenarios. Here, the games that are already
+# decided are scored once. Then each level of the recursion fixes one undecided
+# game and only adds that game's points (and bonus misses) to the running totals
+# of every bracket. So all the scenarios that share a prefix share its scoring.
+#
+# Requires numpy.
+
+import numpy as np
+
+from models import Scorer, kGamePoints, kGameRound, kGameBonus
+from vector_mc import Tournament, teamId, ownerColumns, ownerScores, eliteEightScores, prizeWinners
+
+# The result of one scenario, in the terms initdb.py prints them.
+class Outcome(object):
+    def __init__(self, scenario: int, p: float):
+        self.scenario = scenario
+        self.p = p # Probability of the scenario, according to the Elo ratings
+        self.winners = {} # {gid: Team} for the enumerated games
+        self.sum_2 = {} # {owner: [bid1, bid2]} that share the prize
+        self.single = {} # {owner: bid} that share the prize
+        self.elite_eight = set() # {owner} that share the prize
+
+# Enumerate all 2^len(sim_gids) outcomes of the games in `sim_gids`. Every other
+# game must already have a winner.
+#
+# Returns a list of `Outcome`s, indexed by scenario. The ith bit of a scenario says
+# whether team1 wins the ith game of sim_gids (like the loop in initdb.py).
+def enumerateOutcomes(tour: Tournament, owners, sim_gids):
+    brackets = [b for owner in owners.values() for b in owner.brackets]
+    picks = tour.encodeBrackets(brackets).astype(np.int64)
+    owner_cols = ownerColumns(owners, brackets)
+    slots = {gid: i for i, gid in enumerate(tour.slot_gids)}
+    bonus_points = np.array(Scorer(tour.slot_gids).bonus_points)
+    teams = {teamId(team): team for team in tour.teams}
+    num_teams = len(tour.teams)
+
+    bits = {gid: i for i, gid in enumerate(sim_gids)}
+    todo = sorted(sim_gids, reverse=True) # Children before parents
+    truth = tour.truth()
+    winners = [int(t) for t in tour.leaves]
+
+    def matchup(gid):
+        if gid in tour.play_in:
+            return tour.play_in[gid]
+        return winners[2 * gid], winners[2 * gid + 1]
+
+    # Add one game to the running totals of every bracket.
+    def score(gid, winner, points, missed, elite_eight):
+        hits = picks[:, slots[gid]] == winner
+        points = points + hits * kGamePoints[gid]
+        if kGameBonus[gid] is not None:
+            missed = missed | np.where(hits, 0, 1 << kGameBonus[gid])
+        if kGameRound[gid] == 3:
+            elite_eight = elite_eight + hits
+        return points, missed, elite_eight
+
+    # Score the decided games once
+    state = [np.zeros(len(brackets), dtype=np.int64) for _ in range(3)]
+    for gid in tour.sim_gids:
+        if gid in bits:
+            continue
+        if gid not in truth:
+            raise ValueError("Game %s is not decided, and is not in sim_gids" % gid)
+        winners[gid] = truth[gid]
+        state = score(gid, truth[gid], *state)
+
+    num_scenarios = 1 << len(sim_gids)
+    scores = np.zeros((len(brackets), num_scenarios), dtype=np.int64)
+    elite_eight_counts = np.zeros((len(brackets), num_scenarios), dtype=np.int64)
+    outcomes = [None] * num_scenarios
+
+    def visit(depth, points, missed, elite_eight, p, scenario):
+        if depth == len(todo):
+            scores[:, scenario] = points + bonus_points[missed]
+            elite_eight_counts[:, scenario] = elite_eight
+            outcome = Outcome(scenario, p)
+            for gid in sim_gids:
+                outcome.winners[gid] = teams[winners[gid]]
+            outcomes[scenario] = outcome
+            return
+
+        gid = todo[depth]
+        t1, t2 = matchup(gid)
+        p1_wins = tour.p[t1 * num_teams + t2]
+        winners[gid] = t1
+        visit(depth + 1, *score(gid, t1, points, missed, elite_eight), p * p1_wins, scenario | (1 << bits[gid]))
+        winners[gid] = t2
+        visit(depth + 1, *score(gid, t2, points, missed, elite_eight), p * (1.0 - p1_wins), scenario)
+
+    visit(0, *state, 1.0, 0)
+
+    # Determine the payouts of every scenario at once
+    names = list(owners.keys())
+    sum_2, single = ownerScores(scores, owner_cols)
+    sum_2_winners = prizeWinners(sum_2).T.tolist()
+    single_winners = prizeWinners(single).T.tolist()
+    elite_eight_winners = prizeWinners(eliteEightScores(elite_eight_counts, owner_cols)).T.tolist()
+    bracket_scores = scores.T.tolist()
+    for scenario, outcome in enumerate(outcomes):
+        for o, name in enumerate(names):
+            if elite_eight_winners[scenario][o]:
+                outcome.elite_eight.add(name)
+            if not sum_2_winners[scenario][o] and not single_winners[scenario][o]:
+                continue
+            # Highest score first, then highest bid. (Like ownerBest2Brackets)
+            pts_ids = [[bracket_scores[scenario][b], brackets[b].bid] for b in owner_cols[o]]
+            pts_ids.sort(reverse=True)
+            if sum_2_winners[scenario][o]:
+                outcome.sum_2[name] = [pts_ids[0][1], pts_ids[1][1]]
+            if single_winners[scenario][o]:
+                outcome.single[name] = pts_ids[0][1]
+    return outcomes
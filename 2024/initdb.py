@@ -3,29 +3,43 @@
 # python3 initdb.py
 # ```
 
-from models import Team, Game, Bracket, Slot, Owner, kPointsPerRound
+from models import Team, Game, Bracket, Slot, Owner, Workspace, Scorer, kPointsPerRound, kRoundToTeamDepth
 import math
 import random
 from collections import deque
 import itertools
-import copy
+from vector_mc import Tournament
+from draft_value import preDraftValues
+from draft_assistant import DraftSims, DraftAssistant, snakeOwner
+from exact import payoutOdds
+from exhaustive import enumerateOutcomes
+from bracket_pool import generatePool, selectPool
+from metrics import BracketMetrics
+from bit_bracket import BitBracket, BitLayout
 
 # ======== Initialization Methods ============
 
 year = '2024'
 
-def loadDraft(brackets):
-    owners = {}
+# [[owner, bid], ...] in pick order. The draft can still be in progress.
+def readDraft():
+    draft = []
     path = year + '/data/draft.csv'
     picks = open(path).read().split('\n')
     for pick in picks:
         if not pick or pick[0] == '#':
             continue
         owner, bid = pick.split(',')
+        draft.append([owner, int(bid)])
+    return draft
+
+def loadDraft(brackets):
+    owners = {}
+    for owner, bid in readDraft():
         if owner not in owners:
             owners[owner] = Owner(owner)
 
-        bracket = brackets[int(bid) - 1] # Brackets are 1-indexed
+        bracket = brackets[bid - 1] # Brackets are 1-indexed
         bracket.owner = owner
         owners[owner].brackets.append(bracket)
     return owners
@@ -192,45 +206,33 @@ def truthPlus538Compare(game: Game) -> bool:
         return game.winner == game.team1
     return prob538Compare(game)
 
-def generateBracket(games_src, sorted_gids, winner_f, bid: int = 0):
-    bracket = Bracket(bid)
-
-    # TODO : comment is stale. delete or update or something.
-    #
-    # Let's reverse the list so that we are counting down to the championship game.
-    # Let's also make a copy because we will be writing values to `Game` objects,
-    # and we do not want the original to be affected.
-    games = copy.deepcopy(games_src)
-    for gid in sorted_gids:
-        game = games[gid]
-        team1_wins = winner_f(game)
-        winner = game.team2
-        if team1_wins:
-            winner = game.team1
-
-        # Add the slot to the bracket
-        bracket.slots.appendleft(Slot(bracket, winner, game))
-
-        # Propogate the winning team to the next round, unless this is the final game.
-        if gid == 1:
-            continue
-        next_gid = gid // 2
-        is_next_team1 = gid % 2 == 0
-        if is_next_team1:
-            games[next_gid].team1 = winner
-        else:
-            games[next_gid].team2 = winner
-
-    return bracket
+# Slots reference the shared `Game` objects, which are left untouched. Pass in a
+# `Workspace` when generating many brackets in a loop, so it is reused.
+def generateBracket(games_src, sorted_gids, winner_f, bid: int = 0, workspace: Workspace = None):
+    if workspace is None:
+        workspace = Workspace(games_src, sorted_gids)
+    return workspace.generate(winner_f, bid)
+
+# {bid: [sum of 2, best, elite eight] expected prize shares} before the draft.
+# (See draft_value.py) Computed once, for both cheat sheets.
+draft_values = {}
+def draftValues(brackets):
+    key = tuple(bracket.bid for bracket in brackets)
+    if key not in draft_values:
+        draft_values[key] = preDraftValues(brackets, tournament, kNumOwners, kSeed)[0]
+    return draft_values[key]
 
 # Generate a cheat sheet with relevant information to make drafting easier.
 def writeCheatSheet(brackets, streak_gids):
     path = year + "/data/cheat_sheet.txt"
     with open(path, "w+") as file:
+        scores = metrics.bracketScores(brackets)
+        values = draftValues(brackets)
         for bracket in brackets:
-            str_chalk = str(round(bracket.calcChalkScore(chalk), 2))
-            str_538 = str(round(bracket.calc538Score(), 2))
-            str_heat = str(round(bracket.calcHeatScore(streak_gids), 4))
+            str_chalk = str(round(scores[bracket.bid]["chalk"], 2))
+            str_538 = str(round(scores[bracket.bid]["538"], 2))
+            str_heat = str(round(scores[bracket.bid]["heat"], 4))
+            str_bb = str(round(100 * values[bracket.bid][1], 2))
 
             # Extract the winners from the Elite Eight and on...
             #
@@ -258,17 +260,23 @@ def writeCheatSheet(brackets, streak_gids):
             file.write("Chalk Score:  %s\n" % str_chalk)
             file.write("538 Score:    %s\n" % str_538)
             file.write("HEAT Score:   %s\n" % str_heat)
+            file.write("BB Share:     %s%%\n" % str_bb)
             file.write("\n")
 
 # Write in a different format that allows for sorting
 def writeSortableCheatSheet(brackets, streak_gids):
     path = year + "/data/sortable_cheat_sheet.csv"
     with open(path, "w+") as file:
-        file.write("ID,Chalk Score,538 Score,HEAT Score,Winner,Runner Up,Purdue Depth,UVA Depth\n")
+        file.write("ID,Chalk Score,538 Score,HEAT Score,BB Share (%),Sum of 2 Share (%),E8 Share (%),Winner,Runner Up,Purdue Depth,UVA Depth\n")
+        scores = metrics.bracketScores(brackets)
+        values = draftValues(brackets)
         for bracket in brackets:
-            str_chalk = str(round(bracket.calcChalkScore(chalk), 2))
-            str_538 = str(round(bracket.calc538Score(), 2))
-            str_heat = str(round(bracket.calcHeatScore(streak_gids), 4))
+            str_chalk = str(round(scores[bracket.bid]["chalk"], 2))
+            str_538 = str(round(scores[bracket.bid]["538"], 2))
+            str_heat = str(round(scores[bracket.bid]["heat"], 4))
+            str_bb = str(round(100 * values[bracket.bid][1], 2))
+            str_sum_2 = str(round(100 * values[bracket.bid][0], 2))
+            str_ee = str(round(100 * values[bracket.bid][2], 2))
             purdue = bracket.teamDepth(teams_lookup["Purdue"], True)
             uva = bracket.teamDepth(teams_lookup["Virginia"], True)
 
@@ -284,52 +292,28 @@ def writeSortableCheatSheet(brackets, streak_gids):
                 ordered.append(str(slot.winner))
 
             # Write the information to the file
-            file.write("%s,%s,%s,%s,%s,%s,%s,%s\n" % (str(bracket.bid), str_chalk, str_538, str_heat, ordered[0], ordered[1], purdue, uva))
+            file.write("%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s\n" % (str(bracket.bid), str_chalk, str_538, str_heat, str_bb, str_sum_2, str_ee, ordered[0], ordered[1], purdue, uva))
+
+# How many brackets have each team going at least as far as each round. (See
+# BracketMetrics.exposure)
+def writeTeamDepths(brackets):
+    path = year + "/data/team_depths.csv"
+    exposure = metrics.exposure(brackets)
+    # Every bracket has every team at least in the First Four, so start at the
+    # Round of 64. (For the play-in teams, that is who has them winning.)
+    with open(path, "w+") as file:
+        file.write("Team,%s\n" % ",".join(kRoundToTeamDepth[1:]))
+        for team in teams:
+            file.write("%s,%s\n" % (str(team), ",".join(str(count) for count in exposure[team.overall_seed - 1][1:])))
 
 # ======== Monte Carlo Simulation ============
 
-def bonusIndex(gid: int):
-    round = 7 - gid.bit_length()
-    # There are no bonuses awarded for getting the First 4 games (round 0) correct
-    # or for getting the overall Winner correct (round 6)
-    if round == 0 or round == 6:
-        return None
-    
-    if round == 5: # Final 4 winners aka National Championship participants.
-        return 1
-
-    if round == 4: # Elite 8 winners aka Final 4 participants.
-        return 2
-    
-    # TODO : Document. I am going to just assign each bonus a unique ID.
-    # TODO : remember where this calculation comes from. Give examples?
-    return 4 * round + gid // pow(2, 4 - round) - 3 # Duh...
-
 # TODO : I think this method is associative
 # Returns total points
+#
+# The brackets are compared by team ids, using the lookup tables in `scorer`.
 def bracketCompare(b1: Bracket, b2: Bracket):
-    # Game Points + Bonuses
-    total_points = 0
-    bonuses = {}
-    for s1, s2 in zip(b1.slots, b2.slots):
-        bonus_index = bonusIndex(s1.game.gid)
-        if bonus_index and bonus_index not in bonuses:
-            bonuses[bonus_index] = True
-
-        # TODO : I do not understand how, but these are different objects
-        # Let's compare team name
-        #if s1.winner == s2.winner:
-        if s1.winner.name == s2.winner.name:
-            total_points += kPointsPerRound[s1.game.round]
-        elif bonus_index:
-            bonuses[bonus_index] = False
-
-    # Sum Bonuses
-    for bonus_achieved in bonuses.values():
-        if bonus_achieved:
-            total_points += 5
-    
-    return total_points
+    return scorer.compare(b1.picks(), b2.picks())
 
 # TODO : Document more and better
 # TODO (with infinite time) : Turn this into a Dataproc job that can run in parallel.
@@ -448,16 +432,23 @@ def MC(n: int, owners, winner_f):
         owner_sum_2_wins[owner_name] = 0.0
         owner_single_wins[owner_name] = 0.0
         
+    # The owners' brackets are converted to bitmasks once; each simulated bracket
+    # is converted once, then scored against all of them. (See bit_bracket.py)
+    owner_bits = {}
+    for owner_name, owner in owners.items():
+        owner_bits[owner_name] = [BitBracket.fromBracket(bracket) for bracket in owner.brackets]
+
+    workspace = Workspace(games, sorted_gids)
     for _ in range(n):
-        mc = generateBracket(games, sorted_gids, winner_f)
+        mc = BitBracket.fromBracket(generateBracket(games, sorted_gids, winner_f, workspace=workspace))
         sum_2_owners = []
         sum_2_score = 0
         single_owners = []
         single_score = 0
 
         # Determine win shares
-        for owner_name, owner in owners.items():
-            points = [[bracketCompare(bracket, mc), bracket.bid] for bracket in owner.brackets]
+        for owner_name, bits in owner_bits.items():
+            points = [[layout.compare(bracket, mc), bracket.bid] for bracket in bits]
             points.sort(reverse=True)
             sum_2 = points[0][0] + points[1][0]
             single = points[0][0]
@@ -490,17 +481,37 @@ load538Forecast(teams_lookup)
 games = loadGames(teams)
 sorted_gids = sorted(games.keys(), reverse=True)
 chalk = generateBracket(games, sorted_gids, chalkCompare)
+tournament = Tournament(teams, games, sorted_gids)
+scorer = Scorer(list(reversed(sorted_gids)))
+layout = BitLayout(teams) # For scoring many simulated brackets in MC()
 streak_gids = loadStreak()
+metrics = BracketMetrics(tournament, chalk, streak_gids) # The cheat sheet scores, for all brackets at once
 
 # ======== Loading Brackets ============
 
 # TODO : Consider unfactoring the generation into a dedicated method (for cleanliness)
 brackets = []
 kGenerateBrackets = False
+kGeneratePool = False # Like kGenerateBrackets, but keep the best kTotalBrackets of kPoolSize candidates (see bracket_pool.py)
+kPoolSize = 1000000
+kPoolPath = year + "/data/pool.bin"
 kGenerateCheatSheets = False
+kVectorizedMC = True # Use the NumPy engine in vector_mc.py (on every core) instead of MC()
+kSeed = None # Set this to reproduce a previous run of the vectorized sims
 kBracketsPerOwner = 4
 kNumOwners = 8
 kTotalBrackets = kBracketsPerOwner * kNumOwners
+kDraftOrder = ["Alex", "Mookie", "Austin", "Bill", "Darren", "Daniel", "Sangburm", "Kyle"] # First round; it snakes after that
+kDraftSimsPath = year + "/data/draft_sims.npz"
+kDraftLookahead = 1 # How many of their own picks to search. Each one past 1 is a lot slower.
+if kGeneratePool:
+    pool = generatePool(kPoolPath, kPoolSize, tournament, chalk, streak_gids, kSeed)
+    selected = selectPool(pool, kTotalBrackets)
+    # Every brackets/N.txt gets replaced, so none of the old brackets are mixed in
+    assert len(selected) == kTotalBrackets
+    for i, index in enumerate(selected):
+        bid = i + 1 # Brackets are 1-indexed
+        pool.bracket(index, teams_lookup, games, bid).writeToFile(year + "/data/brackets/%s.txt" % bid)
 for i in range(kTotalBrackets):
     bid = i + 1 # Brackets are 1-indexed
     path = year + "/data/brackets/%s.txt" % bid
@@ -513,17 +524,27 @@ for i in range(kTotalBrackets):
 if kGenerateCheatSheets:
     writeCheatSheet(brackets, streak_gids)
     writeSortableCheatSheet(brackets, streak_gids)
+    writeTeamDepths(brackets)
 
 # TODO : move out, accept arguments instead of globals.
-# MonteCarlo sim to see which bracket is best
-# TODO : Add to cheat sheet as "BB Share (%)"
+# What each bracket is worth before the draft. (See draft_value.py)
 def preDraftSim():
+    if kVectorizedMC:
+        values, half_widths, n = preDraftValues(brackets, tournament, kNumOwners, kSeed)
+        print("%s simulations" % n)
+        print("ID  Sum of 2 (%)  BB Share (%)  E8 Share (%)")
+        for bid, shares in sorted(values.items(), key=lambda item: -sum(item[1])):
+            print("%-3s %s" % (bid, "  ".join("%5.2f +- %.2f" % (100 * v, 100 * h) for v, h in zip(shares, half_widths[bid]))))
+        return
+
     dern_bids = {}
     for i in range(kTotalBrackets):
         dern_bids[i+1] = 0
+    bits = [BitBracket.fromBracket(b) for b in brackets]
+    workspace = Workspace(games, sorted_gids)
     for i in range(50000):
-        mc = generateBracket(games, sorted_gids, truthPlus538Compare)
-        pts_ids = [[bracketCompare(mc, b), b.bid] for b in brackets]
+        mc = BitBracket.fromBracket(generateBracket(games, sorted_gids, truthPlus538Compare, workspace=workspace))
+        pts_ids = [[layout.compare(mc, b), b.bid] for b in bits]
         pts_ids.sort(reverse=True)
         best_bid = pts_ids[0][1]
         dern_bids[best_bid] +=1
@@ -531,10 +552,23 @@ def preDraftSim():
             print(i)
     print(dern_bids)
 
+# The best next pick, given the picks in draft.csv so far. (See draft_assistant.py)
+# Run it again after every pick; the simulations are saved to kDraftSimsPath.
+def draftAssistant():
+    sims = DraftSims(brackets, tournament, kDraftSimsPath, seed=kSeed)
+    assistant = DraftAssistant(sims, kDraftOrder, kBracketsPerOwner, kSeed)
+    draft = readDraft()
+    print("Pick %s: %s" % (len(draft) + 1, snakeOwner(kDraftOrder, len(draft))))
+    print("ID  Payout  Sum of 2 (%)  BB Share (%)  E8 Share (%)")
+    for bid, payout, shares in assistant.suggest(draft, kDraftLookahead):
+        print("%-3s %.4f  %s" % (bid, payout, "  ".join("%12.2f" % (100 * share) for share in shares.values())))
+
 # =========================================
 # Scaffolding - pre draft
 #preDraftSim()
 #exit(0)
+#draftAssistant()
+#exit(0)
 # =========================================
 
 owners = loadDraft(brackets)
@@ -589,6 +623,8 @@ if kMonteCarlo:
     sim_gids = [16] # UConn vs. Northwestern
     scenarios = 1 << len(sim_gids) # 2^|G|
     sims_per_scenario = 10000 // scenarios
+    if kVectorizedMC:
+        sims_per_scenario = 1000000 // scenarios
     fixed_winners = []
 
 # An exhaustive sim over the Elite Eight games, and on. (128 possibilities).
@@ -599,6 +635,10 @@ if kExhaustive or kEliteEight:
     sims_per_scenario = 1
     fixed_winners = []
 
+# The exhaustive sims walk the tree of remaining games once, up front. (See exhaustive.py)
+if kExhaustive or kEliteEight:
+    outcomes = enumerateOutcomes(tournament, owners, sim_gids)
+
 # Process sim_gids into a better form:
 sim_gids_lookup = {}
 for i, gid in enumerate(sim_gids):
@@ -624,12 +664,25 @@ for scenario in range(scenarios):
         return truthPlus538Compare(game)
     
     # Run simulation
-    sims = MC(sims_per_scenario, owners, f)
+    #
+    # sims = [{owner: share of the sum of 2 prize}, {owner: share of best bracket}, ...]
+    # The vectorized path is exact when few enough games are left (see exact.py).
+    exact = False
+    if kMonteCarlo and kVectorizedMC:
+        team1_wins = {}
+        for i, gid in enumerate(sim_gids):
+            team1_wins[gid] = (scenario >> i) & 1 == 1
+        sims, exact = payoutOdds(sims_per_scenario, owners, tournament, kSeed, team1_wins, fixed_winners)
+    elif kMonteCarlo:
+        sims = MC(sims_per_scenario, owners, f)
+        sims = [{o: v / sims_per_scenario for o, v in h.items()} for h in sims]
 
     # Determine raw probability of this happening
     p = 1.0
     if kExhaustive:
         p = 1.0 / scenarios
+    elif kEliteEight:
+        p = outcomes[scenario].p
     else:
         for i, gid in enumerate(sim_gids):
             game = games[gid]
@@ -647,20 +700,18 @@ for scenario in range(scenarios):
     scenario_winners = []
     for i, gid in enumerate(sim_gids):
         team1_wins = (scenario >> i) & 1 == 1
-        if team1_wins:
+        if kExhaustive or kEliteEight:
+            scenario_winners.append(str(outcomes[scenario].winners[gid]))
+        elif team1_wins:
             scenario_winners.append(str(games[gid].team1))
         else:
             scenario_winners.append(str(games[gid].team2))
 
     if kMonteCarlo:
-        print("IF", " AND ".join(scenario_winners), "(p=%s)" % (str(round(p, 5))))
-
-    if kEliteEight or kExhaustive:
-        mc = generateBracket(games, sorted_gids, f)
+        print("IF", " AND ".join(scenario_winners), "(p=%s)" % (str(round(p, 5))), "(exact)" if exact else "")
 
     if kEliteEight:
-        # DEBUG : Elite Eight : regenerate bracket
-        ee = eliteEightBonus(mc, owners)
+        ee = outcomes[scenario].elite_eight
         ee_winner_str = "|".join([w for w in ee])
         print(",".join([ee_winner_str, str(p)] + scenario_winners))
 
@@ -670,20 +721,24 @@ for scenario in range(scenarios):
         #print()
 
     if kExhaustive:
-        mc_winners = [str(mc.slots[i-1].winner) for i in sim_gids]
-        sum_2 = sumOf2Bonus(mc, owners)
+        mc_winners = scenario_winners
+        sum_2 = outcomes[scenario].sum_2
         sum_2_winners = "|".join(["%s: %s+%s" % (o, v[0], v[1]) for o, v in sum_2.items()])
-        single = singleBonus(mc, owners)
+        single = outcomes[scenario].single
         single_winners = "|".join(["%s: %s" % (o, v) for o, v in single.items()])
         print(",".join([sum_2_winners, single_winners, str(p)] + mc_winners))
 
     if kMonteCarlo:
-        print("OWNER".ljust(10), "SUM OF 2".ljust(10), "BEST".ljust(10), "$$$".ljust(10))
+        print("OWNER".ljust(10), "SUM OF 2 %".ljust(10), "BEST %".ljust(10), "ELITE 8 %".ljust(10), "$$$".ljust(10))
         for owner in owners.values():
             sum_2 = sims[0][owner.name]
             single = sims[1][owner.name]
-            yuge = (sum_2 * 100 + single * 20) / sims_per_scenario
-            print(owner.name.ljust(10), str(round(sum_2, 2)).ljust(10), str(round(single, 2)).ljust(10), str(round(yuge, 2)).ljust(10))
+            # MC() does not track the elite eight payout
+            elite_eight = 0.0
+            if len(sims) > 2:
+                elite_eight = sims[2][owner.name]
+            yuge = sum_2 * 100 + single * 20 + elite_eight * 20
+            print(owner.name.ljust(10), str(round(sum_2 * 100, 2)).ljust(10), str(round(single * 100, 2)).ljust(10), str(round(elite_eight * 100, 2)).ljust(10), str(round(yuge, 2)).ljust(10))
         print()
 
 if kEliteEight:
@@ -0,0 +1,98 @@
+# The cheat sheet metrics (Bracket.calcChalkScore, calc538Score and
+# calcHeatScore), computed for many brackets at once.
+#
+# The brackets are stacked into a (brackets x slots) matrix of team ids, like
+# `Tournament.encodeBrackets`, and every metric is one array expression over the
+# whole matrix. To add a metric, write a method that takes the matrix and returns
+# one value per bracket, and add it to `self.metrics`.
+#
+# Requires numpy.
+
+import numpy as np
+
+from models import kGamePoints, kGameRound
+from vector_mc import Tournament, teamId
+
+class BracketMetrics(object):
+    def __init__(self, tour: Tournament, chalk, streak_gids):
+        self.tour = tour
+        self.rounds = np.array([kGameRound[gid] for gid in tour.slot_gids])
+        self.points = np.array([kGamePoints[gid] for gid in tour.slot_gids], dtype=float)
+        self.chalk = tour.encodeBracket(chalk).astype(np.intp)
+
+        # forecast[team id][round]
+        self.forecast = np.zeros((len(tour.teams), 7))
+        for team in tour.teams:
+            self.forecast[teamId(team)] = team.forecast
+
+        # Slots are 0-indexed; Games are 1-indexed.
+        self.streak_slots = [gid - 1 for gid in streak_gids]
+
+        # name -> metric, in the order the cheat sheets list them
+        self.metrics = {
+            "chalk": self.chalkScores,
+            "538": self.forecastScores,
+            "heat": self.heatScores,
+        }
+
+        # The First Four teams start at depth 0. (See Bracket.depths)
+        self.initial_depths = np.ones(len(tour.teams), dtype=np.int8)
+        for teams in tour.play_in.values():
+            self.initial_depths[teams] = 0
+
+        # Results of bracketScores and bracketDepths, by the bids of the brackets
+        self.cache = {}
+        self.depth_cache = {}
+
+    # Bracket.calcChalkScore. The chalk bracket has the best overall seed of
+    # every game, so the difference is never negative.
+    def chalkScores(self, picks):
+        return ((1.0 - np.sqrt((picks - self.chalk) / 67)) * self.points).sum(axis=1)
+
+    # Bracket.calc538Score
+    def forecastScores(self, picks):
+        return (self.forecast[picks, self.rounds] * self.points).sum(axis=1)
+
+    # Bracket.calcHeatScore
+    def heatScores(self, picks):
+        return np.cumprod(self.forecast[picks[:, self.streak_slots], 1], axis=1).sum(axis=1)
+
+    # Returns {metric name: array, one value per row of picks}
+    def score(self, picks):
+        picks = picks.astype(np.intp)
+        return {name: f(picks) for name, f in self.metrics.items()}
+
+    # Returns {bid: {metric name: value}}. Computed once per set of brackets,
+    # so every cheat sheet can ask for it.
+    def bracketScores(self, brackets):
+        key = tuple(bracket.bid for bracket in brackets)
+        if key not in self.cache:
+            scores = self.score(self.tour.encodeBrackets(brackets))
+            self.cache[key] = {}
+            for i, bracket in enumerate(brackets):
+                self.cache[key][bracket.bid] = {name: float(values[i]) for name, values in scores.items()}
+        return self.cache[key]
+
+    # Returns a (brackets x teams) matrix: the index into kRoundToTeamDepth of
+    # how far each bracket has each team going. Same as Bracket.depths, but by
+    # team id.
+    def depths(self, picks):
+        picks = picks.astype(np.intp)
+        depths = np.tile(self.initial_depths, (picks.shape[0], 1))
+        rows = np.arange(picks.shape[0])
+        for i, round in enumerate(self.rounds):
+            depths[rows, picks[:, i]] = np.maximum(depths[rows, picks[:, i]], round + 1)
+        return depths
+
+    # depths() for a list of brackets, computed once per set of brackets.
+    def bracketDepths(self, brackets):
+        key = tuple(bracket.bid for bracket in brackets)
+        if key not in self.depth_cache:
+            self.depth_cache[key] = self.depths(self.tour.encodeBrackets(brackets))
+        return self.depth_cache[key]
+
+    # The team exposure of a set of brackets: exposure[team id][depth] = how many
+    # of the brackets have the team going at least that far.
+    def exposure(self, brackets):
+        depths = self.bracketDepths(brackets)
+        return np.stack([(depths >= depth).sum(axis=0) for depth in range(8)], axis=1)
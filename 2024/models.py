@@ -1,12 +1,41 @@
 # These classes are the predecessors to Django Models
 
 from collections import deque
-import itertools
 
 # The weight of each game
 kPointsPerRound = [1, 1, 2, 3, 5, 8, 13]
 kRoundToTeamDepth = ["First Four", "Round of 64", "Round of 32", "Sweet 16", "Elite 8", "Final 4", "Runner Up", "Winner"]
 
+def bonusIndex(gid: int):
+    round = 7 - gid.bit_length()
+    # There are no bonuses awarded for getting the First 4 games (round 0) correct
+    # or for getting the overall Winner correct (round 6)
+    if round == 0 or round == 6:
+        return None
+    
+    if round == 5: # Final 4 winners aka National Championship participants.
+        return 1
+
+    if round == 4: # Elite 8 winners aka Final 4 participants.
+        return 2
+    
+    # TODO : Document. I am going to just assign each bonus a unique ID.
+    # TODO : remember where this calculation comes from. Give examples?
+    return 4 * round + gid // pow(2, 4 - round) - 3 # Duh...
+
+# Per game lookup tables, indexed by Game ID. Built once, at import.
+#
+# Bonus groups are renumbered 0, 1, 2, ... so they can be used as bit positions.
+# A group of `None` means the game does not count towards any bonus.
+kGameRound = [None] + [7 - gid.bit_length() for gid in range(1, 128)]
+kGamePoints = [None] + [kPointsPerRound[kGameRound[gid]] for gid in range(1, 128)]
+kBonusIndexes = sorted(set(bonusIndex(gid) for gid in range(1, 128)) - {None})
+kGameBonus = [None] * 128
+for gid in range(1, 128):
+    if bonusIndex(gid):
+        kGameBonus[gid] = kBonusIndexes.index(bonusIndex(gid))
+kNumBonuses = len(kBonusIndexes)
+
 class Team(object):
     def __init__(self, name: str, overall_seed: int):
         self.name = name
@@ -29,8 +58,8 @@ class Team(object):
 class Game(object):
     def __init__(self, gid: int):
         self.gid = gid
-        self.round = 7 - gid.bit_length() # 0 = First Four; 6 = Championship.
-        self.points = kPointsPerRound[self.round]
+        self.round = kGameRound[gid] # 0 = First Four; 6 = Championship.
+        self.points = kGamePoints[gid]
         self.winner = None
         self.team1 = None
         self.team2 = None
@@ -40,6 +69,8 @@ class Bracket(object):
         self.bid = bid
         self.owner = None
         self.slots = deque()
+        self.pick_ids = None
+        self.team_depths = None
 
     # DEBUG : print just so I can verify the generator works.
     def __str__(self):
@@ -82,31 +113,35 @@ class Bracket(object):
             bracket.slots.append(Slot(bracket, teams_lookup[team_name], games[int(gid)]))
         return bracket
 
-    # TODO : I am not sure this should be a member function
+    # The winner of each slot as an integer id (the overall seed), in slot order.
+    # This is cached, so only call it once the bracket is complete.
+    def picks(self):
+        if self.pick_ids is None:
+            self.pick_ids = [slot.winner.overall_seed for slot in self.slots]
+        return self.pick_ids
+
+    # depths[overall_seed] = the index into kRoundToTeamDepth of how far the bracket
+    # has the team going. (Entry 0 is unused.) This is cached, so only call it once
+    # the bracket is complete.
+    #
+    # A team goes one round past the last game the bracket has it winning. First
+    # Four teams start at 0, everyone else at 1.
+    def depths(self):
+        if self.team_depths is None:
+            depths = [1] * (len(self.slots) + 2)
+            depths[0] = None
+            for slot in self.slots:
+                if slot.game.round == 0:
+                    depths[slot.game.team1.overall_seed] = 0
+                    depths[slot.game.team2.overall_seed] = 0
+            for slot in self.slots:
+                seed = slot.winner.overall_seed
+                depths[seed] = max(depths[seed], slot.game.round + 1)
+            self.team_depths = depths
+        return self.team_depths
+
     def teamDepth(self, team: Team, sortable: bool = False):
-        gid = team.first_game.gid
-
-        # Playin slots do not lineup with Game IDs. The 4 games are at the end of self.slots.
-        # We will do a linear search from the end of list to find the game.
-        #
-        # I almost certainly should have made slots a map instead of a list
-        if team.play_in:
-            for playin_slot in itertools.islice(reversed(self.slots), 0, 4):
-                if playin_slot.game.gid == gid:
-                    if playin_slot.winner == team:
-                        gid //= 2
-                        break
-                    return kRoundToTeamDepth[0] # First Four
-
-        round = 1
-        slot = self.slots[gid - 1] # gid is 1-indexed; self.slots is 0-indexed.
-        while slot.winner == team:
-            round += 1
-            gid //= 2
-            if gid < 0:
-                break
-            slot = self.slots[gid - 1]
-        
+        round = self.depths()[team.overall_seed]
         if sortable:
             return "%s: %s" % (round, kRoundToTeamDepth[round])
         return kRoundToTeamDepth[round]
@@ -150,6 +185,92 @@ class Bracket(object):
             total += current
         return total
 
+# Scores one bracket against another. All of the per slot work (rounds, points,
+# bonus groups) is looked up once, up front, so `compare` only compares integers.
+#
+# slot_gids = the Game ID of each slot, in slot order.
+class Scorer(object):
+    def __init__(self, slot_gids):
+        self.points = [kGamePoints[gid] for gid in slot_gids]
+        self.bonus_bits = []
+        groups = set()
+        for gid in slot_gids:
+            if kGameBonus[gid] is None:
+                self.bonus_bits.append(0)
+            else:
+                self.bonus_bits.append(1 << kGameBonus[gid])
+                groups.add(kGameBonus[gid])
+
+        # bonus_points[missed] = total bonus points, given the bitmask of bonus groups that were missed.
+        self.bonus_points = []
+        for missed in range(1 << kNumBonuses):
+            self.bonus_points.append(5 * len([g for g in groups if not (missed >> g) & 1]))
+
+    # Returns total points. Takes the lists returned by `Bracket.picks()`.
+    def compare(self, picks1, picks2):
+        points = 0
+        missed = 0
+        for p1, p2, pts, bit in zip(picks1, picks2, self.points, self.bonus_bits):
+            if p1 == p2:
+                points += pts
+            else:
+                missed |= bit
+        return points + self.bonus_points[missed]
+
+# Scratch space for generating brackets without copying (or writing to) the
+# shared `Game` and `Team` objects. Create one per set of games, and reuse it
+# between draws.
+#
+# winners[gid] holds the team that won game `gid` in the current draw. Entries
+# [64, 128) that are not First Four games hold the teams that start in the Round
+# of 64. So the teams playing in game `gid` are always at 2 * gid and 2 * gid + 1.
+class Workspace(object):
+    def __init__(self, games, sorted_gids):
+        self.games = games
+        self.sorted_gids = sorted_gids
+        self.initial = [None] * 128
+        for gid in range(32, 64):
+            if 2 * gid not in games:
+                self.initial[2 * gid] = games[gid].team1
+            if 2 * gid + 1 not in games:
+                self.initial[2 * gid + 1] = games[gid].team2
+        self.winners = list(self.initial)
+
+        # The `Game` handed to the winner functions. Only its fields change between games.
+        self.view = Game(1)
+
+    def reset(self):
+        self.winners[:] = self.initial
+
+    # Generate a bracket by calling `winner_f` on each game, from the First Four to the
+    # championship. `winner_f` returns True if `team1` wins.
+    def generate(self, winner_f, bid: int = 0):
+        self.reset()
+        bracket = Bracket(bid)
+        winners = self.winners
+        view = self.view
+        for gid in self.sorted_gids:
+            game = self.games[gid]
+            view.gid = gid
+            view.round = game.round
+            view.points = game.points
+            view.winner = game.winner
+
+            # First Four games are the only ones with fixed teams.
+            if gid >= 64:
+                view.team1 = game.team1
+                view.team2 = game.team2
+            else:
+                view.team1 = winners[2 * gid]
+                view.team2 = winners[2 * gid + 1]
+
+            winner = view.team2
+            if winner_f(view):
+                winner = view.team1
+            winners[gid] = winner
+            bracket.slots.appendleft(Slot(bracket, winner, game))
+        return bracket
+
 class Slot(object):
     def __init__(self, bracket: Bracket, winner: Team, game: Game):
         self.bracket = bracket
@@ -0,0 +1,78 @@
+# Runs the vectorized Monte Carlo simulation (vector_mc.py) on every core.
+#
+# The simulations are split into fixed size shards. Shard i always draws from the
+# i-th child of `SeedSequence(seed)`, no matter how many workers there are, and
+# the shares are exact integers (see shareUnits). So a given seed produces the
+# same result with 1 worker or with 64.
+
+import concurrent.futures
+import multiprocessing
+import os
+import numpy as np
+
+from vector_mc import Tournament, kChunkSize, ownerColumns, shareUnits, simulateShares
+
+kShardSize = 4 * kChunkSize
+
+# Workers are forked, so they inherit the loaded data instead of re-running
+# initdb.py. Where fork is not available (Windows), everything runs in-process.
+def workerContext():
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+# The per worker state, set once by initWorker() instead of being sent with every shard.
+worker_state = {}
+
+def initWorker(state):
+    worker_state.update(state)
+
+def mcShard(shard):
+    seed, n = shard
+    s = worker_state
+    rng = np.random.default_rng(seed)
+    return simulateShares(s["tour"], n, s["picks"], s["owner_cols"], rng, s["team1_wins"], s["fixed_winners"])
+
+# Split n simulations into shards, each with its own seed.
+def shards(n: int, seed):
+    sizes = [kShardSize] * (n // kShardSize)
+    if n % kShardSize:
+        sizes.append(n % kShardSize)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    return list(zip(seeds, sizes))
+
+# Run `f` over every shard and add up the results, in shard order.
+def runShards(f, n: int, seed, state, workers=None):
+    jobs = shards(n, seed)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    context = workerContext()
+    if workers <= 1 or len(jobs) <= 1 or context is None:
+        initWorker(state)
+        results = [f(job) for job in jobs]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(min(workers, len(jobs)), mp_context=context, initializer=initWorker, initargs=(state,)) as pool:
+            results = list(pool.map(f, jobs))
+
+    total = results[0]
+    for result in results[1:]:
+        total = np.add(total, result)
+    return total
+
+# Like vectorMC(), but sharded over `workers` processes (default: all cores).
+#
+# Returns [owner_sum_2_wins, owner_single_wins, owner_elite_eight_wins]
+def parallelMC(n: int, owners, tour: Tournament, seed=None, team1_wins={}, fixed_winners=[], workers=None):
+    brackets = [b for owner in owners.values() for b in owner.brackets]
+    state = {
+        "tour": tour,
+        "picks": tour.encodeBrackets(brackets),
+        "owner_cols": ownerColumns(owners, brackets),
+        "team1_wins": team1_wins,
+        "fixed_winners": fixed_winners,
+    }
+    totals = runShards(mcShard, n, seed, state, workers)
+
+    units = shareUnits(len(owners))
+    names = list(owners.keys())
+    return [dict(zip(names, (total / units).tolist())) for total in totals]
@@ -0,0 +1,240 @@
+# A batched version of the Monte Carlo simulation in initdb.py.
+#
+# Instead of building one `Bracket` per simulation and comparing `Slot` objects
+# in Python, every game of N tournaments is drawn at once with NumPy, and every
+# drafted bracket is scored against all of them with array operations.
+#
+# Requires numpy:
+# ```sh
+# pip install numpy
+# ```
+#
+# The encoding:
+#   - Teams are identified by an integer id: `overall_seed - 1`.
+#   - A simulated tournament is a column of 128 team ids, indexed by Game ID.
+#     Entry `gid` holds the winner of that game. Entries [64, 128) that are not
+#     First Four games hold the teams that start in the Round of 64. So the teams
+#     playing in game `gid` are always at `2 * gid` and `2 * gid + 1`.
+#   - A bracket is a row of team ids, in the same order as `Bracket.slots`.
+#
+# The simulations are stored "one game per row", so that each game (and each
+# bracket's score) is a contiguous array of N values. That layout is what makes
+# the array operations fast.
+
+import math
+import numpy as np
+
+from models import kPointsPerRound, kGameRound, kGameBonus, kNumBonuses
+
+# Same constant as prob538Compare()
+kEloScale = .175
+
+# Simulations are drawn and scored in chunks, to bound the memory usage.
+kChunkSize = 1 << 16
+
+def teamId(team) -> int:
+    return team.overall_seed - 1
+
+class Tournament(object):
+    def __init__(self, teams, games, sorted_gids):
+        self.teams = teams
+        self.games = games
+
+        # Games are simulated from the First Four towards the championship.
+        self.sim_gids = list(sorted_gids)
+        # Slots are ordered from the championship out. (The way generateBracket builds them)
+        self.slot_gids = list(reversed(sorted_gids))
+
+        # p[t1 * len(teams) + t2] = probability that t1 beats t2, according to the Elo ratings.
+        ratings = np.zeros(len(teams))
+        for team in teams:
+            ratings[teamId(team)] = team.rating
+        self.p = (1.0 / (1.0 + np.exp((ratings[None, :] - ratings[:, None]) * kEloScale))).ravel()
+
+        # The teams that start in the Round of 64 (or in the First Four)
+        self.leaves = np.full(128, -1, dtype=np.int8)
+        for gid in range(32, 64):
+            for i, team in enumerate([games[gid].team1, games[gid].team2]):
+                if 2 * gid + i not in games:
+                    self.leaves[2 * gid + i] = teamId(team)
+        self.play_in = {}
+        for gid in self.sim_gids:
+            if gid >= 64:
+                self.play_in[gid] = [teamId(games[gid].team1), teamId(games[gid].team2)]
+
+
+    # The winners that are already known. (Set on `Game.winner`.)
+    def truth(self):
+        h = {}
+        for gid in self.sim_gids:
+            winner = self.games[gid].winner
+            if winner:
+                h[gid] = teamId(winner)
+        return h
+
+    # Convert a `Bracket` into a row of team ids, in slot order.
+    def encodeBracket(self, bracket):
+        return np.array([teamId(slot.winner) for slot in bracket.slots], dtype=np.int8)
+
+    # Stack a list of brackets into a (brackets x slots) matrix.
+    def encodeBrackets(self, brackets):
+        return np.stack([self.encodeBracket(b) for b in brackets])
+
+# Draw `n` tournaments. Returns a (128 x n) matrix of team ids, indexed by Game ID.
+#
+# team1_wins     = {gid: bool} forces the outcome of a game. (e.g. a scenario)
+# fixed_winners  = [team name, ...] the first team in the list wins every game it
+#                  plays, the second team wins every game until it meets the first. Etc.
+#
+# The precedence matches the `f` defined in initdb.py: fixed winners, then
+# forced outcomes, then the known results, then the Elo ratings.
+def simulate(tour: Tournament, n: int, rng, team1_wins={}, fixed_winners=[]):
+    w = np.empty((128, n), dtype=np.int8)
+    w[64:] = tour.leaves[64:, None]
+
+    truth = tour.truth()
+    rank = np.full(len(tour.teams), len(fixed_winners), dtype=np.int16)
+    names = {team.name: teamId(team) for team in tour.teams}
+    for i, name in enumerate(fixed_winners):
+        rank[names[name]] = i
+
+    for gid in tour.sim_gids:
+        if gid in tour.play_in:
+            t1 = np.full(n, tour.play_in[gid][0], dtype=np.int8)
+            t2 = np.full(n, tour.play_in[gid][1], dtype=np.int8)
+        else:
+            t1 = w[2 * gid]
+            t2 = w[2 * gid + 1]
+
+        if gid in team1_wins:
+            t1_wins = np.full(n, team1_wins[gid])
+        elif gid in truth:
+            t1_wins = t1 == truth[gid]
+        else:
+            t1_wins = rng.random(n) < tour.p[t1.astype(np.intp) * len(tour.teams) + t2]
+
+        if fixed_winners:
+            r1 = rank[t1]
+            r2 = rank[t2]
+            t1_wins = np.where(r1 == r2, t1_wins, r1 < r2)
+
+        w[gid] = np.where(t1_wins, t1, t2)
+    return w
+
+# Score every bracket against every simulated tournament.
+#
+# picks   = (brackets x slots) matrix from `Tournament.encodeBrackets`
+# winners = (128 x n) matrix from `simulate`
+#
+# Returns a (brackets x n) matrix of points, bonuses included, and a (brackets x n)
+# matrix of how many Elite Eight teams each bracket got right.
+def scoreBrackets(tour: Tournament, picks, winners):
+    shape = (picks.shape[0], winners.shape[1])
+    counts = np.zeros((7,) + shape, dtype=np.int8) # correct picks per round
+    bonuses = np.ones((kNumBonuses,) + shape, dtype=bool)
+    for i, gid in enumerate(tour.slot_gids):
+        hits = winners[gid][None, :] == picks[:, i, None]
+        counts[kGameRound[gid]] += hits
+        bonus = kGameBonus[gid]
+        if bonus is not None:
+            bonuses[bonus] &= hits
+
+    scores = 5 * bonuses.sum(axis=0, dtype=np.int16)
+    for round, points in enumerate(kPointsPerRound):
+        scores += points * counts[round].astype(np.int16)
+    # Elite Eight teams = the winners of games [8, 16), aka round 3
+    return scores, counts[3]
+
+# Build the (owners x brackets per owner) matrix of bracket indices.
+#
+# brackets = the list of brackets that was passed to `Tournament.encodeBrackets`
+def ownerColumns(owners, brackets):
+    index = {b.bid: i for i, b in enumerate(brackets)}
+    return np.array([[index[b.bid] for b in owner.brackets] for owner in owners.values()])
+
+# Shares are counted in units of 1/shareUnits(n) of a prize, where n is the number
+# of owners. Any tie splits into a whole number of units, so the totals are exact
+# integers and can be added up in any order.
+def shareUnits(num_owners: int) -> int:
+    return math.lcm(*range(1, num_owners + 1))
+
+# The owners with the maximum value, one column per simulation.
+def prizeWinners(values):
+    return values == values.max(axis=0)
+
+# Split the prizes between the owners with the maximum value, one column per simulation.
+# Returns the total shares per owner, in units.
+def splitShares(values):
+    winners = prizeWinners(values)
+    units = shareUnits(values.shape[0])
+    return (winners * (units // winners.sum(axis=0))).sum(axis=1)
+
+# Returns the (owners x n) [sum of 2, best bracket] scores, given a (brackets x n)
+# matrix of scores.
+def ownerScores(scores, owner_cols):
+    owner_scores = np.sort(scores[owner_cols], axis=1)
+    single = owner_scores[:, -1]
+    sum_2 = single + owner_scores[:, -2]
+    return sum_2, single
+
+# Returns the total [sum of 2 shares, best bracket shares] per owner (in units),
+# given a (brackets x n) matrix of scores.
+def ownerShares(scores, owner_cols):
+    sum_2, single = ownerScores(scores, owner_cols)
+    return splitShares(sum_2), splitShares(single)
+
+# Returns a (owners x n) elite eight "score", given a (brackets x n) matrix of Elite
+# Eight counts. The owner(s) with the highest score win. See eliteEightBonus() in
+# initdb.py for the tie breakers.
+#
+# The tie breakers are applied all at once, by packing an owner's [best, worst,
+# 2nd best, 2nd worst, ...] counts into one number.
+def eliteEightScores(elite_eight, owner_cols):
+    return eliteEightKeys(np.sort(elite_eight[owner_cols], axis=1))
+
+# The packed keys, given the (owners x brackets per owner x n) Elite Eight counts,
+# sorted along the brackets.
+def eliteEightKeys(owner_ee):
+    owner_ee = owner_ee.astype(np.int64)
+    k = owner_ee.shape[1]
+    key = np.zeros((owner_ee.shape[0], owner_ee.shape[2]), dtype=np.int64)
+    for depth in range(k):
+        if depth % 2 == 0:
+            key = key * 9 + owner_ee[:, k - 1 - depth // 2]
+        else:
+            key = key * 9 + 8 - owner_ee[:, depth // 2]
+    return key
+
+# Returns the total elite eight shares per owner (in units), given a (brackets x n)
+# matrix of Elite Eight counts.
+def eliteEightShares(elite_eight, owner_cols):
+    return splitShares(eliteEightScores(elite_eight, owner_cols))
+
+# Run `n` simulations, in chunks.
+#
+# Returns the total [sum of 2, best bracket, elite eight] shares per owner, in units.
+def simulateShares(tour: Tournament, n: int, picks, owner_cols, rng, team1_wins={}, fixed_winners=[]):
+    totals = [np.zeros(owner_cols.shape[0], dtype=np.int64) for _ in range(3)]
+    for start in range(0, n, kChunkSize):
+        winners = simulate(tour, min(kChunkSize, n - start), rng, team1_wins, fixed_winners)
+        scores, elite_eight = scoreBrackets(tour, picks, winners)
+        sum_2, single = ownerShares(scores, owner_cols)
+        totals[0] += sum_2
+        totals[1] += single
+        totals[2] += eliteEightShares(elite_eight, owner_cols)
+    return totals
+
+# Drop in replacement for MC() in initdb.py.
+#
+# Returns [owner_sum_2_wins, owner_single_wins], like MC().
+def vectorMC(n: int, owners, tour: Tournament, team1_wins={}, fixed_winners=[], rng=None):
+    if rng is None:
+        rng = np.random.default_rng()
+    brackets = [b for owner in owners.values() for b in owner.brackets]
+    picks = tour.encodeBrackets(brackets)
+    owner_cols = ownerColumns(owners, brackets)
+    totals = simulateShares(tour, n, picks, owner_cols, rng, team1_wins, fixed_winners)
+
+    units = shareUnits(len(owners))
+    names = list(owners.keys())
+    return [dict(zip(names, (totals[0] / units).tolist())), dict(zip(names, (totals[1] / units).tolist()))]